@@ -7,9 +7,10 @@ from tkcalendar import Calendar
 import imghdr
 from PIL import Image, ImageTk
 import os
-import hashlib
 import logging
 import re
+from thumbnail_cache import make_thumbnail
+from receipt_ingest import ReceiptIngest
 
 class AddTransactionTab:
     def __init__(self, app):
@@ -23,11 +24,12 @@ class AddTransactionTab:
         handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
         self.logger.addHandler(handler)
         
-        self.max_document_size = 5 * 1024 * 1024
+        self.max_document_size = app.db.max_document_size
         self.max_image_dimension = 5000
         self.max_bytes_per_pixel = 3
         self.allowed_extensions = ['.jpg', '.jpeg']
         self.allowed_mime_types = ['jpeg', 'jpg']
+        self.receipt_ingest = ReceiptIngest()
         
         self.date_entry_width = 20
         self.desc_entry_width = 20
@@ -163,7 +165,18 @@ class AddTransactionTab:
         )
         self.remove_button.pack(side=tk.LEFT, padx=5)
         
-        self.document_data = None
+        # Receipts are recompressed before storing; only admins may keep the original file
+        self.keep_original_var = tk.BooleanVar(value=False)
+        self.keep_original_check = ttk.Checkbutton(
+            doc_frame,
+            text="Ruaj origjinalin",
+            variable=self.keep_original_var,
+            state=tk.DISABLED
+        )
+        self.keep_original_check.pack(side=tk.LEFT, padx=5)
+        
+        self.document_path = None
+        self.document_thumbnail = None
         self.document_filename = None
         self.document_size = 0
         
@@ -266,13 +279,12 @@ class AddTransactionTab:
             if not self.is_valid_image(filename):
                 raise ValueError("File is not a valid JPEG image or contains suspicious content")
                 
-            with open(filename, 'rb') as f:
-                document_data = f.read()
-                
-            file_hash = hashlib.sha256(document_data).hexdigest()
+            # Only the path is kept; the journal copies the file when the transaction is added
+            file_hash = self.app.db.hash_file(filename)
             self.logger.info(f"Document attached: {filename}, Size: {file_size}, Hash: {file_hash}")
                 
-            self.document_data = document_data
+            self.document_path = filename
+            self.document_thumbnail = make_thumbnail(filename)
             self.document_filename = self.sanitize_filename(os.path.basename(filename))
             self.document_size = file_size
             self.doc_name_var.set(self.document_filename)
@@ -285,16 +297,14 @@ class AddTransactionTab:
             self.remove_document()
 
     def remove_document(self):
-        self.document_data = None
+        self.document_path = None
+        self.document_thumbnail = None
         self.document_filename = None
         self.document_size = 0
         self.doc_name_var.set("")
         self.remove_button.config(state=tk.DISABLED)
 
     def add_transaction(self):
-        if not self.app.check_db_connection():
-            return
-    
         try:
             if hasattr(self.app, 'current_user') and self.app.current_user['role'] != 'admin':
                 date_str = datetime.now().strftime("%d-%m-%Y %H:%M")
@@ -311,6 +321,12 @@ class AddTransactionTab:
             if not description:
                 messagebox.showerror("Error", "Description cannot be empty")
                 return
+            # Checked before journaling: the server would reject the entry only after "added successfully"
+            if len(description) > self.app.db.MAX_DESCRIPTION_LENGTH:
+                messagebox.showerror(
+                    "Error", f"Description cannot be longer than {self.app.db.MAX_DESCRIPTION_LENGTH} characters"
+                )
+                return
         
             try:
                 amount = float(self.amount_entry.get())
@@ -327,33 +343,45 @@ class AddTransactionTab:
 
             self.logger.info(
                 f"Attempting to add transaction: {date_str}, {currency}, {amount}, "
-                f"{transaction_type}, User: {user_id}, Doc: {bool(self.document_data)}"
+                f"{transaction_type}, User: {user_id}, Doc: {bool(self.document_path)}"
             )
 
-            success = self.app.db.add_transaction(
-                date_str, 
-                currency, 
-                description, 
-                amount, 
-                transaction_type,
-                user_id,
-                self.document_data,
-                self.document_filename
-            )
+            transaction = {
+                'date_str': date_str,
+                'currency': currency,
+                'description': description,
+                'amount': amount,
+                'transaction_type': transaction_type,
+                'user_id': user_id,
+                'document_name': self.document_filename
+            }
+            receipt = {'data': None, 'path': None}
+            if self.document_path:
+                is_admin = hasattr(self.app, 'current_user') and self.app.current_user['role'] == 'admin'
+                receipt = self.receipt_ingest.process(self.document_path, keep_original=is_admin and self.keep_original_var.get())
+                transaction['document_width'] = receipt['width']
+                transaction['document_height'] = receipt['height']
+                self.logger.info(
+                    f"Receipt {'kept as original' if receipt['path'] else 'recompressed'}: "
+                    f"{self.document_size} -> {receipt['size']} bytes, {receipt['width']}x{receipt['height']}"
+                )
 
-            if success:
-                self.logger.info("Transaction added successfully")
-                messagebox.showinfo("Success", "Transaction added successfully!")
-        
-                self.desc_entry.delete("1.0", tk.END)
-                self.amount_entry.delete(0, tk.END)
-                self.remove_document()
-        
-                self.app.view_balances_tab.update_balances_view()
-                self.app.generate_report_tab.generate_report()
-            else:
-                self.logger.error("Failed to add transaction to database")
-                messagebox.showerror("Error", "Failed to add transaction to database")
+            # The journal is local and fsync'd, so the entry is safe before the server has seen it
+            self.app.journal.append(
+                transaction,
+                document_data=receipt['data'],
+                document_path=receipt['path'],
+                thumbnail=self.document_thumbnail
+            )
+            
+            self.logger.info("Transaction added to the write journal")
+            messagebox.showinfo("Success", "Transaction added successfully!")
+    
+            self.desc_entry.delete("1.0", tk.END)
+            self.amount_entry.delete(0, tk.END)
+            self.remove_document()
+    
+            self.app.replay_journal()
             
         except Exception as e:
             error_msg = f"An error occurred: {str(e)}"
@@ -410,7 +438,10 @@ class AddTransactionTab:
                 self.date_entry.config(state='normal')
                 self.cal_button.config(state='normal')
                 self.attach_button.config(state='normal')
+                self.keep_original_check.config(state='normal')
             else:
+                self.keep_original_var.set(False)
+                self.keep_original_check.config(state='disabled')
                 self.date_entry.config(state='disabled')
                 self.cal_button.config(state='disabled')
                 self.date_var.set(datetime.now().strftime("%d-%m-%Y %H:%M"))
@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # closed: calls go through. open: calls fail fast with CircuitOpenError while a background thread
+    # waits out a jittered exponential backoff. half-open: that thread is probing the server; a
+    # successful probe closes the circuit, a failed one reopens it with a longer delay.
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, probe, failure_threshold=2, base_delay=1.0, max_delay=60.0):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.retry_at = 0.0
+        self.last_error = None
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.logger = logging.getLogger('ARKA.CircuitBreaker')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_connection.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+    def add_listener(self, listener):
+        # Called as listener(old_state, new_state) on the thread that caused the change
+        self._listeners.append(listener)
+
+    def check(self):
+        with self._cond:
+            if self.state != self.CLOSED:
+                retry_in = max(0.0, self.retry_at - time.monotonic())
+                raise CircuitOpenError(
+                    f"Database unavailable ({self.last_error}); next reconnect attempt in {retry_in:.0f}s"
+                )
+
+    def record_success(self):
+        with self._cond:
+            old_state = self.state
+            self.failures = 0
+            self.open_count = 0
+            self.state = self.CLOSED
+        if old_state != self.CLOSED:
+            self.logger.info("Database reachable again, circuit closed")
+            self._notify(old_state, self.CLOSED)
+
+    def record_failure(self, error):
+        with self._cond:
+            self.failures += 1
+            self.last_error = error
+            # Once open, only the probe thread moves the circuit on
+            if self.state != self.CLOSED or self.failures < self.failure_threshold:
+                return
+            self._open()
+        self._notify(self.CLOSED, self.OPEN)
+
+    def _open(self):
+        # Equal jitter: half the backoff is fixed, half random, so clients that lost the server together spread out
+        self.open_count += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.open_count - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.state = self.OPEN
+        self.retry_at = time.monotonic() + delay
+        self.logger.warning(f"Circuit open after: {self.last_error}; probing again in {delay:.1f}s")
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._probe_loop, name='ArkaCircuitProbe', daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def probe_now(self):
+        # Skips the rest of the backoff, e.g. when the user asks to reconnect
+        with self._cond:
+            if self.state == self.OPEN:
+                self.retry_at = time.monotonic()
+                self._cond.notify_all()
+
+    def _probe_loop(self):
+        while True:
+            with self._cond:
+                while self.state == self.OPEN and time.monotonic() < self.retry_at:
+                    self._cond.wait(self.retry_at - time.monotonic())
+                if self.state == self.CLOSED:
+                    return
+                self.state = self.HALF_OPEN
+            self._notify(self.OPEN, self.HALF_OPEN)
+
+            try:
+                self.probe()
+            except Exception as e:
+                with self._cond:
+                    self.last_error = e
+                    self._open()
+                self._notify(self.HALF_OPEN, self.OPEN)
+                continue
+
+            self.record_success()
+            return
+
+    def get_state(self):
+        with self._cond:
+            return self.state, max(0.0, self.retry_at - time.monotonic()), self.last_error
+
+    def _notify(self, old_state, new_state):
+        for listener in self._listeners:
+            try:
+                listener(old_state, new_state)
+            except Exception as e:
+                self.logger.error(f"Circuit listener failed: {e}", exc_info=True)
@@ -0,0 +1,182 @@
+import threading
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TRANSACTION_TYPES = ('income', 'expense')
+
+
+class ColumnarRows:
+    # Report rows held only as NumPy columns: dates as datetime64, amounts as int64 cents, currency and
+    # type as small integer codes, sizes as int64. Display tuples are built from the columns for the rows
+    # that are actually asked for, so a long report keeps no Python object per row beyond its strings.
+    # Amounts arrive as floats (the report queries cast them), which hold cents exactly up to ~9e13.
+    COLUMNS = (
+        ('id', 'int64'),
+        ('registration_date', 'datetime64[us]'),
+        ('currency', 'int16'),
+        ('description', object),
+        ('amount', 'int64'),
+        ('transaction_type', 'int8'),
+        ('created_by', object),
+        ('deleted_by', object),
+        ('document_name', object),
+        ('document_size', 'int64'),
+        ('document_hash', object)
+    )
+
+    def __init__(self):
+        self.currencies = []
+        self._currency_codes = {}
+        # Columns grow like a list: extra capacity is reserved so appending a page copies rarely
+        self._data = {name: np.empty(0, dtype=dtype) for name, dtype in self.COLUMNS}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def __len__(self):
+        return self._size
+
+    def _encode_currencies(self, values):
+        # Only the distinct values of a page go through Python; the codes are mapped back in one step
+        uniques, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        with self._lock:
+            for currency in uniques:
+                if currency not in self._currency_codes:
+                    self._currency_codes[currency] = len(self.currencies)
+                    self.currencies.append(currency)
+            codes = np.array([self._currency_codes[currency] for currency in uniques], dtype=np.int16)
+        return codes[inverse.reshape(-1)]
+
+    def make_block(self, rows):
+        # Turns a page of rows (the shape of Database.iter_filtered_transactions) into columns. Safe to
+        # call on the db worker; the block is added with append_block on the thread that reads the rows.
+        if not rows:
+            return None
+        values = list(zip(*rows))
+        return {
+            'id': np.array(values[0], dtype=np.int64),
+            'registration_date': np.array(values[1], dtype='datetime64[us]'),
+            'currency': self._encode_currencies(values[2]),
+            'description': np.array(values[3], dtype=object),
+            'amount': np.rint(np.array(values[4], dtype=np.float64) * 100).astype(np.int64),
+            'transaction_type': (np.array(values[5], dtype=object) == TRANSACTION_TYPES[1]).astype(np.int8),
+            'created_by': np.array(values[6], dtype=object),
+            'deleted_by': np.array(values[7], dtype=object),
+            'document_name': np.array(values[8], dtype=object),
+            'document_size': np.array([size or 0 for size in values[9]], dtype=np.int64),
+            'document_hash': np.array(values[10], dtype=object)
+        }
+
+    def append_block(self, block):
+        if block is None:
+            return
+        count = len(block['id'])
+        size = self._size + count
+        if size > len(self._data['id']):
+            capacity = max(size, 2 * len(self._data['id']))
+            for name, dtype in self.COLUMNS:
+                column = np.empty(capacity, dtype=dtype)
+                column[:self._size] = self._data[name][:self._size]
+                self._data[name] = column
+        for name, _ in self.COLUMNS:
+            self._data[name][self._size:size] = block[name]
+        self._size = size
+
+    def append(self, rows):
+        self.append_block(self.make_block(rows))
+
+    @property
+    def columns(self):
+        return {name: column[:self._size] for name, column in self._data.items()}
+
+    def rows(self, start, stop):
+        # Row tuples for positions start to stop, in the same shape the rows were appended in
+        columns = {name: column[start:min(stop, self._size)] for name, column in self._data.items()}
+        return list(zip(
+            columns['id'].tolist(),
+            columns['registration_date'].astype(object).tolist(),
+            [self.currencies[code] for code in columns['currency'].tolist()],
+            columns['description'].tolist(),
+            (columns['amount'] / 100).tolist(),
+            [TRANSACTION_TYPES[code] for code in columns['transaction_type'].tolist()],
+            columns['created_by'].tolist(),
+            columns['deleted_by'].tolist(),
+            columns['document_name'].tolist(),
+            [size or None for size in columns['document_size'].tolist()],
+            columns['document_hash'].tolist()
+        ))
+
+    def iter_rows(self, batch_size=1000):
+        for start in range(0, self._size, batch_size):
+            yield from self.rows(start, start + batch_size)
+
+    def mask(self, ids=None, currency=None, transaction_type=None, from_date=None, to_date=None):
+        columns = self.columns
+        selected = np.ones(self._size, dtype=bool)
+        if ids is not None:
+            selected &= np.isin(columns['id'], np.fromiter(ids, dtype=np.int64))
+        if currency is not None:
+            code = self._currency_codes.get(currency)
+            selected &= columns['currency'] == (code if code is not None else -1)
+        if transaction_type is not None:
+            selected &= columns['transaction_type'] == TRANSACTION_TYPES.index(transaction_type)
+        if from_date is not None:
+            selected &= columns['registration_date'] >= np.datetime64(from_date, 's')
+        if to_date is not None:
+            selected &= columns['registration_date'] <= np.datetime64(to_date, 's')
+        return selected
+
+    def totals(self, mask=None):
+        # Same result as Database.summarize_totals: {currency: {'income', 'expense', 'count'}}
+        columns = self.columns
+        groups = columns['currency'].astype(np.int64) * 2 + columns['transaction_type']
+        amounts = columns['amount']
+        if mask is not None:
+            groups = groups[mask]
+            amounts = amounts[mask]
+
+        size = len(self.currencies) * 2
+        counts = np.bincount(groups, minlength=size)
+        # bincount would sum through float64; np.add.at keeps the cents exact
+        cents = np.zeros(size, dtype=np.int64)
+        np.add.at(cents, groups, amounts)
+
+        totals = {}
+        for group in np.flatnonzero(counts):
+            entry = totals.setdefault(
+                self.currencies[group // 2], {'income': Decimal('0'), 'expense': Decimal('0'), 'count': 0}
+            )
+            entry[TRANSACTION_TYPES[group % 2]] += Decimal(int(cents[group])).scaleb(-2)
+            entry['count'] += int(counts[group])
+        return totals
+
+    def order(self, field, reverse=False):
+        # Row positions in sorted order. Ties keep their current order, also when reversed, matching
+        # list.sort; equal dates are ordered by id, like the report's keyset pages.
+        columns = self.columns
+        if field == 'registration_date':
+            order = np.lexsort((columns['id'], columns['registration_date']))
+            return order[::-1] if reverse else order
+
+        values = columns[field]
+        if field == 'currency':
+            ranks = np.empty(len(self.currencies), dtype=np.int64)
+            ranks[np.argsort(np.array(self.currencies, dtype=object))] = np.arange(len(self.currencies))
+            values = ranks[values]
+        elif values.dtype == object:
+            values = np.char.lower(np.where(np.equal(values, None), '', values).astype(str))
+
+        if not reverse:
+            return np.argsort(values, kind='stable')
+        return (len(values) - 1 - np.argsort(values[::-1], kind='stable'))[::-1]
+
+    def take(self, order):
+        # Reorders the rows to the given positions
+        self._data = {name: column[order] for name, column in self.columns.items()}
@@ -0,0 +1,197 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, conn, generation):
+        self.conn = conn
+        self.generation = generation
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.pending_statements = 0
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_statements = 0
+
+    def rollback(self):
+        self.pending_statements = 0
+        self.conn.rollback()
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, validate, max_size=5, idle_timeout=30, max_lifetime=1800, acquire_timeout=30):
+        self._connect = connect
+        self._validate = validate
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []
+        self._size = 0
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'validations': 0,
+            'invalidated': 0,
+            'recycled': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+        }
+
+    def acquire(self, timeout=None):
+        start = time.monotonic()
+        deadline = start + (self.acquire_timeout if timeout is None else timeout)
+        waited = False
+
+        while True:
+            pooled = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {time.monotonic() - start:.1f} seconds"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                generation = self._generation
+
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(self._connect(), generation)
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif not self._is_usable(pooled):
+                pooled.close()
+                self._forget()
+                continue
+
+            self._record_checkout(time.monotonic() - start, waited)
+            return pooled
+
+    def release(self, pooled, discard=False):
+        now = time.monotonic()
+        with self._cond:
+            expired = now - pooled.created_at > self.max_lifetime
+            stale = pooled.generation != self._generation
+            if not (discard or expired or stale):
+                pooled.last_used = now
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+            if expired:
+                self._stats['recycled'] += 1
+        pooled.close()
+        self._forget()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        pooled = self.acquire(timeout)
+        discard = False
+        try:
+            yield pooled
+        except Exception:
+            try:
+                pooled.rollback()
+            except Exception:
+                discard = True
+            raise
+        else:
+            # Ends the implicit transaction reads open on SQL Server and drops any uncommitted writes,
+            # so the next checkout starts clean and can be retried on a reconnect
+            try:
+                pooled.rollback()
+            except Exception:
+                discard = True
+        finally:
+            self.release(pooled, discard)
+
+    def reconnect(self, pooled):
+        pooled.close()
+        pooled.conn = self._connect()
+        pooled.created_at = time.monotonic()
+        pooled.last_used = pooled.created_at
+        pooled.pending_statements = 0
+        with self._cond:
+            pooled.generation = self._generation
+            self._stats['created'] += 1
+
+    def close_all(self):
+        with self._cond:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            pooled.close()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+    def _is_usable(self, pooled):
+        now = time.monotonic()
+        if pooled.generation != self._generation:
+            return False
+        if now - pooled.created_at > self.max_lifetime:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if now - pooled.last_used <= self.idle_timeout:
+            return True
+        with self._cond:
+            self._stats['validations'] += 1
+        if self._validate(pooled.conn):
+            return True
+        with self._cond:
+            self._stats['invalidated'] += 1
+        return False
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _record_checkout(self, wait_time, waited):
+        with self._cond:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
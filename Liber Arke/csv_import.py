@@ -0,0 +1,189 @@
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+
+CSV_COLUMNS = ['date', 'description', 'currency', 'amount', 'transaction_type']
+DATE_FORMAT = "%d-%m-%Y %H:%M"
+TRANSACTION_TYPES = ('income', 'expense')
+
+
+class CsvImportError(Exception):
+    pass
+
+
+class CsvImporter:
+    def __init__(self, db, path, user_id=None, chunk_size=1000, checkpoint_path=None):
+        self.db = db
+        self.path = os.path.abspath(path)
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        # Checkpoints live in the database; this file is only read to resume imports started before that
+        self.checkpoint_path = checkpoint_path or self.path + '.checkpoint'
+        self.max_reported_errors = 100
+        self.cancel_requested = False
+        self.stored_offset = None
+
+        self.logger = logging.getLogger('ARKA.CsvImporter')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_import.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+    def read_checkpoint(self):
+        # Returns (checkpoint, stored offset or None when the database has no checkpoint for this file)
+        checkpoint = self.db.get_import_checkpoint(self.path)
+        stored_offset = checkpoint['offset'] if checkpoint else None
+        if checkpoint is None and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('source') != self.path:
+                raise CsvImportError(f"Checkpoint {self.checkpoint_path} belongs to {checkpoint.get('source')}")
+        if checkpoint and checkpoint['offset'] > os.path.getsize(self.path):
+            raise CsvImportError("Source file is shorter than the checkpoint offset; it was changed since the last run")
+        return checkpoint, stored_offset
+
+    def cancel(self):
+        # Checked between chunks; the checkpoint of the last committed chunk is kept for resuming
+        self.cancel_requested = True
+
+    def reset(self):
+        self.db.reset_import_checkpoint(self.path)
+        if os.path.exists(self.checkpoint_path):
+            os.unlink(self.checkpoint_path)
+
+    def parse_row(self, row):
+        if len(row) != len(CSV_COLUMNS):
+            raise ValueError(f"Expected {len(CSV_COLUMNS)} columns, got {len(row)}")
+
+        date_str, description, currency, amount_str, transaction_type = (value.strip() for value in row)
+
+        try:
+            datetime.strptime(date_str, DATE_FORMAT)
+        except ValueError:
+            raise ValueError(f"Invalid date '{date_str}', expected DD-MM-YYYY HH:MM")
+
+        if not description:
+            raise ValueError("Description cannot be empty")
+        if len(description) > self.db.MAX_DESCRIPTION_LENGTH:
+            raise ValueError(f"Description is longer than {self.db.MAX_DESCRIPTION_LENGTH} characters")
+
+        if not currency:
+            raise ValueError("Currency cannot be empty")
+
+        try:
+            amount = float(amount_str.replace(',', ''))
+        except ValueError:
+            raise ValueError(f"Invalid amount '{amount_str}'")
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+
+        transaction_type = transaction_type.lower()
+        if transaction_type not in TRANSACTION_TYPES:
+            raise ValueError(f"Invalid transaction type '{transaction_type}'")
+
+        return {
+            'date_str': date_str,
+            'currency': currency.upper(),
+            'description': description,
+            'amount': amount,
+            'transaction_type': transaction_type,
+            'user_id': self.user_id
+        }
+
+    def _read_lines(self, f, position):
+        while True:
+            at_start = f.tell() == 0
+            line = f.readline()
+            if not line:
+                return
+            # The csv reader pulls lines lazily, so this is the end of the row it last returned
+            position['offset'] = f.tell()
+            yield line.decode('utf-8-sig' if at_start else 'utf-8')
+
+    def run(self, progress=None):
+        checkpoint, self.stored_offset = self.read_checkpoint()
+        checkpoint = checkpoint or {
+            'source': self.path,
+            'offset': 0,
+            'line': 0,
+            'imported': 0,
+            'rejected': 0
+        }
+        base_line = checkpoint['line']
+        errors = []
+
+        with open(self.path, 'rb') as f:
+            f.seek(checkpoint['offset'])
+            position = {'offset': checkpoint['offset']}
+            reader = csv.reader(self._read_lines(f, position))
+
+            if checkpoint['offset'] == 0:
+                header = next(reader, None)
+                if header is None:
+                    return self._summary(checkpoint, errors)
+                if [column.strip().lower() for column in header] != CSV_COLUMNS:
+                    raise CsvImportError(f"Unexpected header {header}, expected {','.join(CSV_COLUMNS)}")
+
+            chunk = []
+            rejected = 0
+            for row in reader:
+                if not row:
+                    continue
+                try:
+                    chunk.append(self.parse_row(row))
+                except ValueError as e:
+                    line = base_line + reader.line_num
+                    rejected += 1
+                    self.logger.warning(f"{self.path}:{line} rejected: {e}")
+                    if len(errors) < self.max_reported_errors:
+                        errors.append((line, str(e)))
+
+                if len(chunk) >= self.chunk_size:
+                    self._commit_chunk(chunk, rejected, checkpoint, position['offset'], base_line + reader.line_num)
+                    chunk = []
+                    rejected = 0
+                    if progress:
+                        progress(checkpoint)
+                    if self.cancel_requested:
+                        self.logger.info(f"Import of {self.path} cancelled at line {checkpoint['line']}")
+                        return self._summary(checkpoint, errors, cancelled=True)
+
+            self._commit_chunk(chunk, rejected, checkpoint, position['offset'], base_line + reader.line_num)
+            if progress:
+                progress(checkpoint)
+
+        self.logger.info(
+            f"Import of {self.path} finished: {checkpoint['imported']} imported, {checkpoint['rejected']} rejected"
+        )
+        return self._summary(checkpoint, errors)
+
+    def _commit_chunk(self, chunk, rejected, checkpoint, offset, line):
+        advanced = dict(
+            checkpoint,
+            imported=checkpoint['imported'] + len(chunk),
+            rejected=checkpoint['rejected'] + rejected,
+            offset=offset,
+            line=line
+        )
+        try:
+            # The rows and the checkpoint commit together, so a resumed import never inserts them twice
+            self.db.add_import_chunk(chunk, advanced, self.stored_offset)
+        except Exception as e:
+            raise CsvImportError(
+                f"Import stopped after line {checkpoint['line']} (byte {checkpoint['offset']}): {str(e)}"
+            )
+        checkpoint.update(advanced)
+        self.stored_offset = offset
+
+    @staticmethod
+    def _summary(checkpoint, errors, cancelled=False):
+        return {
+            'imported': checkpoint['imported'],
+            'rejected': checkpoint['rejected'],
+            'offset': checkpoint['offset'],
+            'errors': errors,
+            'cancelled': cancelled
+        }
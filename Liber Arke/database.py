@@ -1,141 +1,204 @@
-import pyodbc
 from datetime import datetime
+from decimal import Decimal
 from dotenv import load_dotenv
 import os
 import hashlib
+import io
 import time
 import re
+import threading
+from connection_pool import ConnectionPool, PoolTimeoutError
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from storage_backends import create_backend
+from migrations import apply_migrations, get_schema_version
+from query_stats import QueryStats, InstrumentedCursor
+import description_index
 
 load_dotenv()
 
 class Database:
-    def __init__(self):
-        self.server = os.getenv('SQL_SERVER')
-        self.database = os.getenv('SQL_DATABASE')
-        self.driver = os.getenv('SQL_DRIVER', 'ODBC Driver 17 for SQL Server')
-        self.auth_type = os.getenv('SQL_AUTH', 'Windows')
-        self.username = os.getenv('SQL_USERNAME')
-        self.password = os.getenv('SQL_PASSWORD')
+    # Lengths of transactions.description and document_name on SQL Server
+    MAX_DESCRIPTION_LENGTH = 255
+    MAX_NAME_LENGTH = 255
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_backend()
+        self.query_stats = QueryStats(
+            slow_query_threshold=float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '500')) / 1000
+        )
+        # The ARKA.Database logger, set up by QueryStats to write to arka_queries.log
+        self.logger = self.query_stats.logger
+        
+        self.circuit = CircuitBreaker(
+            self.probe_server,
+            failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '2')),
+            base_delay=float(os.getenv('CIRCUIT_BASE_DELAY', '1')),
+            max_delay=float(os.getenv('CIRCUIT_MAX_DELAY', '60'))
+        )
+        self.circuit.add_listener(self.on_circuit_change)
+        self.schema_ready = False
+        
+        self.pool = ConnectionPool(
+            self.open_connection,
+            self.ping,
+            max_size=int(os.getenv('SQL_POOL_SIZE', '5')),
+            idle_timeout=float(os.getenv('SQL_POOL_IDLE_TIMEOUT', '30')),
+            max_lifetime=float(os.getenv('SQL_POOL_MAX_LIFETIME', '1800'))
+        )
+        
+        self.user_directory_ttl = float(os.getenv('USER_CACHE_TTL', '300'))
+        self._user_directory = None
+        self._user_directory_loaded = 0.0
+        self._user_directory_generation = 0
+        self._user_directory_lock = threading.Lock()
         
-        self.conn = None
-        self.connect_with_retry()
-        self.create_tables()
+        self.migrate_schema()
         self.create_default_admin()
-        self.max_document_size = 5 * 1024 * 1024  # 5MB limit
+        self.max_document_size = int(float(os.getenv('MAX_DOCUMENT_SIZE_MB', '5')) * 1024 * 1024)
+        # Documents are hashed, uploaded and downloaded this many bytes at a time
+        self.document_chunk_size = 1024 * 1024
 
-    def get_connection_string(self):
-        if self.auth_type.lower() == 'windows':
-            return f'DRIVER={{{self.driver}}};SERVER={self.server};DATABASE={self.database};Trusted_Connection=yes;'
-        else:
-            return f'DRIVER={{{self.driver}}};SERVER={self.server};DATABASE={self.database};UID={self.username};PWD={self.password};'
+    def open_connection(self):
+        # A single attempt: retries are paced by the circuit breaker's background probe, not by sleeping here
+        self.circuit.check()
+        try:
+            conn = self.backend.connect()
+        except self.backend.Error as e:
+            print(f"Connection failed: {e}")
+            self.circuit.record_failure(e)
+            raise e
+        self.circuit.record_success()
+        return conn
 
-    def connect_with_retry(self, max_retries=3, retry_delay=5):
-        for attempt in range(max_retries):
-            try:
-                self.conn = pyodbc.connect(self.get_connection_string())
-                return True
-            except pyodbc.Error as e:
-                if attempt < max_retries - 1:
-                    print(f"Connection failed (attempt {attempt + 1}), retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    print(f"Failed to connect after {max_retries} attempts")
-                    raise e
-        return False
+    def probe_server(self):
+        self.backend.connect().close()
+
+    def on_circuit_change(self, old_state, new_state):
+        if new_state != CircuitBreaker.CLOSED:
+            return
+        # Pooled connections predate the outage; start over with fresh ones
+        self.pool.close_all()
+        if not self.schema_ready:
+            self.migrate_schema()
+            self.create_default_admin()
+
+    def ping(self, conn):
+        return self.backend.ping(conn)
+
+    def connection(self):
+        self.circuit.check()
+        return self.pool.connection()
 
     def check_connection(self):
         try:
-            if self.conn is None:
-                return False
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.close()
-            return True
-        except pyodbc.Error:
+            with self.connection():
+                return True
+        except (self.backend.Error, PoolTimeoutError, CircuitOpenError):
             return False
 
     def reconnect(self):
+        state, _, _ = self.circuit.get_state()
+        if state != CircuitBreaker.CLOSED:
+            self.circuit.probe_now()
+            return False
         try:
-            self.close()
-            return self.connect_with_retry()
-        except pyodbc.Error as e:
+            self.pool.close_all()
+            with self.connection():
+                return True
+        except (self.backend.Error, PoolTimeoutError, CircuitOpenError) as e:
             print(f"Reconnection failed: {e}")
             return False
 
-    def execute_with_reconnect(self, query, params=None, max_retries=2):
+    def execute_with_reconnect(self, conn, query, params=None, max_retries=2):
+        started = time.perf_counter()
+        reconnects = 0
         for attempt in range(max_retries):
             try:
-                if not self.check_connection():
-                    self.reconnect()
-                
-                cursor = self.conn.cursor()
+                cursor = conn.cursor()
                 if params:
                     cursor.execute(query, params)
                 else:
                     cursor.execute(query)
-                return cursor
-            except pyodbc.Error as e:
-                if attempt < max_retries - 1:
+                # Reads leave nothing to lose on a reconnect; only statements without a result set count
+                if cursor.description is None:
+                    conn.pending_statements += 1
+                return InstrumentedCursor(
+                    cursor, self.query_stats, query, time.perf_counter() - started, attempt, reconnects
+                )
+            except self.backend.Error as e:
+                # Only a connection with no uncommitted work can be swapped out and retried, and only
+                # when the connection may be at fault: a rejected row fails the same way on a new one
+                if attempt < max_retries - 1 and not conn.pending_statements and not self.is_data_error(e):
                     print(f"Query failed (attempt {attempt + 1}), reconnecting...")
-                    self.reconnect()
+                    self.pool.reconnect(conn)
+                    reconnects += 1
                 else:
+                    self.query_stats.record(query, time.perf_counter() - started, 0, attempt, reconnects, e)
                     raise e
         return None
 
-    def create_tables(self):
-        try:
-            cursor = self.execute_with_reconnect("""
-            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='transactions' AND xtype='U')
-            BEGIN
-                CREATE TABLE transactions (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    registration_date DATETIME NOT NULL,
-                    created_on DATETIME NOT NULL,
-                    currency VARCHAR(10) NOT NULL,
-                    description NVARCHAR(255) NOT NULL,
-                    amount DECIMAL(18, 2) NOT NULL,
-                    transaction_type VARCHAR(10) NOT NULL,
-                    deleted BIT DEFAULT 0,
-                    deleted_date DATETIME NULL,
-                    created_by INT NULL,
-                    deleted_by INT NULL,
-                    document VARBINARY(MAX) NULL,
-                    document_name NVARCHAR(255) NULL,
-                    document_size INT NULL,
-                    document_hash NVARCHAR(64) NULL,
-                    FOREIGN KEY (created_by) REFERENCES users(id),
-                    FOREIGN KEY (deleted_by) REFERENCES users(id)
-                )
-            END
-            """)
-            self.conn.commit()
-            
-            cursor = self.execute_with_reconnect("""
-            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='users' AND xtype='U')
-            BEGIN
-                CREATE TABLE users (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    username NVARCHAR(50) NOT NULL UNIQUE,
-                    password NVARCHAR(255) NOT NULL,
-                    role NVARCHAR(20) NOT NULL CHECK (role IN ('admin', 'user')),
-                    created_on DATETIME NOT NULL DEFAULT GETDATE(),
-                    can_upload_documents BIT DEFAULT 0
-                )
-            END
-            """)
-            self.conn.commit()
-        except pyodbc.Error as e:
-            print(f"Error creating tables: {e}")
+    def executemany_with_reconnect(self, conn, query, params_seq, max_retries=2):
+        started = time.perf_counter()
+        reconnects = 0
+        for attempt in range(max_retries):
+            try:
+                cursor = conn.cursor()
+                self.backend.prepare_bulk_cursor(cursor)
+                cursor.executemany(query, params_seq)
+                conn.pending_statements += 1
+                self.query_stats.record(query, time.perf_counter() - started, 0, attempt, reconnects)
+                return cursor
+            except self.backend.Error as e:
+                if attempt < max_retries - 1 and not conn.pending_statements and not self.is_data_error(e):
+                    print(f"Batch failed (attempt {attempt + 1}), reconnecting...")
+                    self.pool.reconnect(conn)
+                    reconnects += 1
+                else:
+                    self.query_stats.record(query, time.perf_counter() - started, 0, attempt, reconnects, e)
+                    raise e
+        return None
+
+    def is_data_error(self, error):
+        return isinstance(error, (self.backend.IntegrityError, self.backend.DataError))
+
+    def get_pool_stats(self):
+        return self.pool.get_stats()
+
+    def get_query_stats(self):
+        return self.query_stats.snapshot()
+
+    def dump_query_stats(self, path):
+        self.query_stats.dump(path, {'pool': self.get_pool_stats()})
+
+    def reset_query_stats(self):
+        self.query_stats.reset()
+
+    def migrate_schema(self):
+        try:
+            applied = apply_migrations(self)
+            self.schema_ready = True
+            return applied
+        except (self.backend.Error, CircuitOpenError) as e:
+            print(f"Error migrating schema: {e}")
+            return []
+
+    def get_schema_version(self):
+        try:
+            return get_schema_version(self)
+        except self.backend.Error as e:
+            print(f"Error reading schema version: {e}")
+            return 0
 
     def create_default_admin(self):
         try:
-            cursor = self.execute_with_reconnect("SELECT 1 FROM users WHERE username = 'admin'")
-            if not cursor.fetchone():
-                cursor = self.execute_with_reconnect("""
-                INSERT INTO users (username, password, role, can_upload_documents)
-                VALUES (?, ?, ?, 1)
-                """, ('admin', self.hash_password('admin123'), 'admin'))
-                self.conn.commit()
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, "SELECT 1 FROM users WHERE username = 'admin'")
+                if not cursor.fetchone():
+                    cursor = self.execute_with_reconnect(conn, """
+                    INSERT INTO users (username, password, role, can_upload_documents)
+                    VALUES (?, ?, ?, 1)
+                    """, ('admin', self.hash_password('admin123'), 'admin'))
+                    conn.commit()
         except Exception as e:
             print(f"Error creating default admin: {e}")
 
@@ -147,238 +210,1103 @@ class Database:
     def hash_document(document_data):
         return hashlib.sha256(document_data).hexdigest()
 
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024):
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def iter_document_source(self, document):
+        # document is either the bytes themselves or the path of a file holding them
+        if isinstance(document, str):
+            with open(document, 'rb') as f:
+                yield from iter(lambda: f.read(self.document_chunk_size), b'')
+        else:
+            for offset in range(0, len(document), self.document_chunk_size):
+                yield document[offset:offset + self.document_chunk_size]
+
+    @staticmethod
+    def to_money(value):
+        return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
     @staticmethod
     def sanitize_filename(filename):
         if not filename:
             return filename
-        filename = os.path.basename(filename)
-        return re.sub(r'[^\w\-_.]', '', filename)
+        filename = re.sub(r'[^\w\-_.]', '', os.path.basename(filename))
+        # document_name is NVARCHAR(255); the extension is kept when a long name is cut
+        root, extension = os.path.splitext(filename)
+        return root[:Database.MAX_NAME_LENGTH - len(extension)] + extension
 
     def authenticate_user(self, username, password):
         try:
-            cursor = self.execute_with_reconnect("""
-            SELECT id, username, role, can_upload_documents FROM users 
-            WHERE username = ? AND password = ?
-            """, (username, self.hash_password(password)))
-            return cursor.fetchone()
-        except pyodbc.Error as e:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                SELECT id, username, role, can_upload_documents FROM users 
+                WHERE username = ? AND password = ?
+                """, (username, self.hash_password(password)))
+                return cursor.fetchone()
+        except self.backend.Error as e:
             print(f"Authentication error: {e}")
             return None
 
+    def get_user_directory(self, refresh=False):
+        # id -> (username, role, can_upload); the users table is small enough to keep whole in memory
+        with self._user_directory_lock:
+            directory = self._user_directory
+            if (directory is not None and not refresh and
+                    time.monotonic() - self._user_directory_loaded < self.user_directory_ttl):
+                return directory
+            generation = self._user_directory_generation
+
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, "SELECT id, username, role, can_upload_documents FROM users")
+            directory = {row[0]: (row[1], row[2], bool(row[3])) for row in cursor.fetchall()}
+
+        with self._user_directory_lock:
+            # A user changed while this was loading, so the rows may already be stale
+            if generation == self._user_directory_generation:
+                self._user_directory = directory
+                self._user_directory_loaded = time.monotonic()
+        return directory
+
+    def invalidate_user_directory(self):
+        with self._user_directory_lock:
+            self._user_directory = None
+            self._user_directory_generation += 1
+
+    def lookup_user(self, user_id):
+        if user_id is None:
+            return None
+        entry = self.get_user_directory().get(user_id)
+        if entry is None:
+            # Possibly created by another client since the last load
+            entry = self.get_user_directory(refresh=True).get(user_id)
+        return entry
+
+    def resolve_user_names(self, rows):
+        # Rows carry created_by and deleted_by ids at 6 and 7; swap them for usernames
+        names = {}
+        for row in rows:
+            row = tuple(row)
+            for user_id in row[6:8]:
+                if user_id not in names:
+                    entry = self.lookup_user(user_id)
+                    names[user_id] = entry[0] if entry else None
+            yield row[:6] + (names[row[6]], names[row[7]]) + row[8:]
+
     def get_user_role(self, user_id):
         try:
-            cursor = self.execute_with_reconnect("SELECT role FROM users WHERE id = ?", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
-        except pyodbc.Error as e:
+            entry = self.lookup_user(user_id)
+            return entry[1] if entry else None
+        except self.backend.Error as e:
             print(f"Error getting user role: {e}")
             return None
 
     def can_user_upload_documents(self, user_id):
         try:
-            cursor = self.execute_with_reconnect("SELECT can_upload_documents FROM users WHERE id = ?", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else False
-        except pyodbc.Error as e:
+            entry = self.lookup_user(user_id)
+            return entry[2] if entry else False
+        except self.backend.Error as e:
             print(f"Error checking upload permissions: {e}")
             return False
 
-    def add_transaction(self, date_str, currency, description, amount, transaction_type, user_id=None, document_data=None, document_name=None):
-        try:
-            if document_data and len(document_data) > self.max_document_size:
-                raise ValueError(f"Document exceeds maximum size of {self.max_document_size} bytes")
+    INSERT_TRANSACTION_SQL = """
+    INSERT INTO transactions 
+    (registration_date, created_on, currency, description, amount, transaction_type, 
+     created_by, document_name, document_size, document_hash, description_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    def prepare_transaction(self, date_str, currency, description, amount, transaction_type, user_id=None, document_data=None, document_name=None, document_path=None, document_thumbnail=None, document_width=None, document_height=None):
+        # A document can be given as bytes or, to keep large scans out of memory, as a file path.
+        # Returns (params, document, document details for store_document) for insert_transactions.
+        document = document_path or document_data
+        document_size = (os.path.getsize(document_path) if document_path else len(document_data)) if document else None
+        if document_size and document_size > self.max_document_size:
+            raise ValueError(f"Document exceeds maximum size of {self.max_document_size} bytes")
+        if len(description) > self.MAX_DESCRIPTION_LENGTH:
+            raise ValueError(f"Description is longer than {self.MAX_DESCRIPTION_LENGTH} characters")
 
-            if document_name:
-                document_name = self.sanitize_filename(document_name)
+        if document_name:
+            document_name = self.sanitize_filename(document_name)
 
+        try:
             registration_date = datetime.strptime(date_str, "%d-%m-%Y %H:%M").strftime("%Y-%m-%d %H:%M:%S")
         except ValueError:
             registration_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
         created_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        document_size = len(document_data) if document_data else None
-        document_hash = self.hash_document(document_data) if document_data else None
-    
+        document_hash = None
+        if document:
+            document_hash = self.hash_file(document_path, self.document_chunk_size) if document_path else self.hash_document(document_data)
+
+        params = (
+            registration_date, created_on, currency, description, amount, transaction_type,
+            user_id, document_name, document_size, document_hash,
+            description_index.description_hash(description)
+        )
+        document_details = {'thumbnail': document_thumbnail, 'width': document_width, 'height': document_height}
+        return params, document, document_details
+
+    def insert_transactions(self, conn, prepared):
+        for params, document, document_details in prepared:
+            if document:
+                self.store_document(conn, params[9], document, params[8], **document_details)
+
+        if len(prepared) == 1:
+            self.execute_with_reconnect(conn, self.INSERT_TRANSACTION_SQL, prepared[0][0])
+        else:
+            self.executemany_with_reconnect(conn, self.INSERT_TRANSACTION_SQL, [params for params, *_ in prepared])
+
+        self.record_ledger_changes(conn, [
+            (params[0], params[2], params[4], params[5]) for params, *_ in prepared
+        ], 1)
+        self.index_descriptions(conn, {params[10]: params[3] for params, *_ in prepared})
+
+    def index_descriptions(self, conn, descriptions):
+        # descriptions maps description_hash -> text; identical descriptions share one set of terms
+        if not descriptions:
+            return
+
+        hashes = list(descriptions)
+        placeholders = ', '.join('?' * len(hashes))
+        cursor = self.execute_with_reconnect(
+            conn, f"SELECT description_hash FROM indexed_descriptions WHERE description_hash IN ({placeholders})", hashes
+        )
+        already_indexed = {row[0] for row in cursor.fetchall()}
+        new_hashes = [description_hash for description_hash in hashes if description_hash not in already_indexed]
+        if not new_hashes:
+            return
+
+        # One statement per table for the whole batch. The inserts skip rows that already exist, so a
+        # description indexed by another writer since the SELECT above doesn't fail the batch.
+        self.executemany_with_reconnect(conn, """
+        INSERT INTO indexed_descriptions (description_hash)
+        SELECT ? WHERE NOT EXISTS (SELECT 1 FROM indexed_descriptions WHERE description_hash = ?)
+        """, [(description_hash, description_hash) for description_hash in new_hashes])
+        self.executemany_with_reconnect(conn, """
+        INSERT INTO description_terms (kind, term, description_hash)
+        SELECT ?, ?, ? WHERE NOT EXISTS (
+            SELECT 1 FROM description_terms WHERE kind = ? AND term = ? AND description_hash = ?
+        )
+        """, [
+            (kind, term, description_hash) * 2
+            for description_hash in new_hashes
+            for kind, term in description_index.terms_for(descriptions[description_hash])
+        ])
+
+    def rebuild_description_index(self, batch_size=500):
+        # Returns how many descriptions were indexed, or None when the backfill failed part-way
+        indexed = 0
         try:
-            cursor = self.execute_with_reconnect("""
-            INSERT INTO transactions 
-            (registration_date, created_on, currency, description, amount, transaction_type, 
-             created_by, document, document_name, document_size, document_hash)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                registration_date, created_on, currency, description, amount, transaction_type,
-                user_id, document_data, document_name, document_size, document_hash
-            ))
-        
-            self.conn.commit()
-            return True
+            with self.connection() as conn:
+                while True:
+                    cursor = self.execute_with_reconnect(conn, """
+                    SELECT id, description FROM transactions
+                    WHERE description_hash IS NULL
+                    ORDER BY id""" + self.backend.limit_clause, (batch_size,))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+
+                    updates = [(description_index.description_hash(description), transaction_id)
+                               for transaction_id, description in rows]
+                    self.executemany_with_reconnect(
+                        conn, "UPDATE transactions SET description_hash = ? WHERE id = ?", updates
+                    )
+                    self.index_descriptions(conn, {
+                        description_hash: description
+                        for (description_hash, _), (_, description) in zip(updates, rows)
+                    })
+                    conn.commit()
+                    indexed += len(rows)
+        except self.backend.Error as e:
+            print(f"Error rebuilding description index: {e}")
+            return None
+        return indexed
+
+    def record_ledger_changes(self, conn, entries, sign):
+        # entries are (registration_date, currency, amount, transaction_type); sign is 1 on insert, -1 on delete
+        balance_deltas = {}
+        for _, currency, amount, transaction_type in entries:
+            delta = balance_deltas.setdefault(currency, [Decimal('0'), Decimal('0')])
+            delta[0 if transaction_type == 'income' else 1] += sign * self.to_money(amount)
+
+        for currency, (income, expense) in balance_deltas.items():
+            self.apply_balance_delta(conn, currency, income, expense)
+
+        rollup_deltas = {}
+        for registration_date, currency, amount, transaction_type in entries:
+            key = (self.day_of(registration_date), currency, transaction_type)
+            delta = rollup_deltas.setdefault(key, [Decimal('0'), 0])
+            delta[0] += sign * self.to_money(amount)
+            delta[1] += sign
+
+        for (day, currency, transaction_type), (total, count) in rollup_deltas.items():
+            self.apply_rollup_delta(conn, day, currency, transaction_type, total, count)
+
+    @staticmethod
+    def day_of(registration_date):
+        if isinstance(registration_date, datetime):
+            return registration_date.strftime("%Y-%m-%d")
+        return str(registration_date)[:10]
+
+    def apply_rollup_delta(self, conn, day, currency, transaction_type, total, count):
+        update_sql = """
+        UPDATE daily_rollups
+        SET total = total + ?, tx_count = tx_count + ?
+        WHERE day = ? AND currency = ? AND transaction_type = ?
+        """
+        params = (total, count, day, currency, transaction_type)
+        cursor = self.execute_with_reconnect(conn, update_sql, params)
+        if cursor.rowcount > 0:
+            return
+
+        try:
+            self.execute_with_reconnect(conn, """
+            INSERT INTO daily_rollups (day, currency, transaction_type, total, tx_count)
+            VALUES (?, ?, ?, ?, ?)
+            """, (day, currency, transaction_type, total, count))
+        except self.backend.IntegrityError:
+            self.execute_with_reconnect(conn, update_sql, params)
+
+    def apply_balance_delta(self, conn, currency, income, expense):
+        updated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        update_sql = """
+        UPDATE currency_balances
+        SET income = income + ?, expense = expense + ?, updated_on = ?
+        WHERE currency = ?
+        """
+        cursor = self.execute_with_reconnect(conn, update_sql, (income, expense, updated_on, currency))
+        if cursor.rowcount > 0:
+            return
+
+        try:
+            self.execute_with_reconnect(conn, """
+            INSERT INTO currency_balances (currency, income, expense, updated_on)
+            VALUES (?, ?, ?, ?)
+            """, (currency, income, expense, updated_on))
+        except self.backend.IntegrityError:
+            self.execute_with_reconnect(conn, update_sql, (income, expense, updated_on, currency))
+
+    def add_transaction(self, date_str, currency, description, amount, transaction_type, user_id=None, document_data=None, document_name=None, document_path=None, document_thumbnail=None, document_width=None, document_height=None):
+        try:
+            prepared = self.prepare_transaction(
+                date_str, currency, description, amount, transaction_type, user_id,
+                document_data, document_name, document_path, document_thumbnail, document_width, document_height
+            )
+            with self.connection() as conn:
+                self.insert_transactions(conn, [prepared])
+                conn.commit()
+                return True
         
-        except pyodbc.Error as e:
+        except self.backend.Error as e:
             print(f"Database error adding transaction: {e}")
-            self.conn.rollback()
             return False
         except Exception as e:
             print(f"Unexpected error adding transaction: {e}")
-            self.conn.rollback()
             return False
 
-    def get_transactions(self, include_deleted=False):
+    def add_transactions_bulk(self, transactions, batch_size=200):
+        # Each item is a dict of add_transaction keyword arguments or a tuple in the same order.
+        # Returns one (success, error) pair per input row, in input order.
+        outcomes = []
+        batch = []
+
+        def insert(rows):
+            with self.connection() as conn:
+                self.insert_transactions(conn, [prepared for _, prepared in rows])
+                conn.commit()
+
+        def flush():
+            if not batch:
+                return
+            try:
+                insert(batch)
+                for index, _ in batch:
+                    outcomes[index] = (True, None)
+            except Exception as e:
+                if len(batch) == 1:
+                    self.logger.error(f"Error adding transaction at row {batch[0][0]}: {e}")
+                    outcomes[batch[0][0]] = (False, str(e))
+                else:
+                    # The batch was rolled back; retrying one row at a time tells the bad rows from the rest
+                    self.logger.warning(f"Transaction batch of {len(batch)} failed, retrying row by row: {e}")
+                    for row in batch:
+                        try:
+                            insert([row])
+                            outcomes[row[0]] = (True, None)
+                        except Exception as row_error:
+                            self.logger.error(f"Error adding transaction at row {row[0]}: {row_error}")
+                            outcomes[row[0]] = (False, str(row_error))
+            batch.clear()
+
+        for transaction in transactions:
+            index = len(outcomes)
+            outcomes.append(None)
+            try:
+                if isinstance(transaction, dict):
+                    prepared = self.prepare_transaction(**transaction)
+                else:
+                    prepared = self.prepare_transaction(*transaction)
+            except (TypeError, ValueError) as e:
+                outcomes[index] = (False, str(e))
+                continue
+
+            batch.append((index, prepared))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        return outcomes
+
+    def add_journal_entries(self, entries):
+        # entries are (entry_id, add_transaction keyword arguments) from the offline write journal.
+        # Entry ids are recorded in the same transaction as the rows, so an entry replayed again after
+        # a crash is inserted only once. Returns (applied entry ids, {entry_id: error} for entries
+        # that can never be inserted); other database errors are raised so the replay is retried later.
         try:
-            if include_deleted:
-                cursor = self.execute_with_reconnect("""
-                SELECT id, registration_date, currency, description, amount, transaction_type,
-                       document_name, document_size
-                FROM transactions
-                """)
+            return self._add_journal_batch(entries)
+        except self.backend.Error:
+            if len(entries) == 1:
+                return self._add_journal_entry(entries[0])
+
+        # One bad entry must not hold back the rest: retry them one transaction each
+        applied = []
+        rejected = {}
+        for entry in entries:
+            entry_applied, entry_rejected = self._add_journal_entry(entry)
+            applied.extend(entry_applied)
+            rejected.update(entry_rejected)
+        return applied, rejected
+
+    def _add_journal_entry(self, entry):
+        # The server refusing the row itself (a constraint, a value too long) will not change on a
+        # retry, so those entries are rejected; anything else, like a lost connection, is raised
+        try:
+            return self._add_journal_batch([entry])
+        except self.backend.Error as e:
+            if not self.is_data_error(e):
+                raise
+            print(f"Journal entry {entry[0]} rejected by the server: {e}")
+            return [], {entry[0]: str(e)}
+
+    def _add_journal_batch(self, entries):
+        applied = []
+        rejected = {}
+        prepared = []
+        new_ids = []
+
+        with self.connection() as conn:
+            entry_ids = [entry_id for entry_id, _ in entries]
+            cursor = self.execute_with_reconnect(conn, f"""
+            SELECT entry_id FROM applied_journal_entries
+            WHERE entry_id IN ({', '.join('?' * len(entry_ids))})
+            """, entry_ids)
+            already_applied = {row[0] for row in cursor.fetchall()}
+
+            for entry_id, transaction in entries:
+                if entry_id in already_applied:
+                    applied.append(entry_id)
+                    continue
+                try:
+                    prepared.append(self.prepare_transaction(**transaction))
+                except (TypeError, ValueError) as e:
+                    rejected[entry_id] = str(e)
+                    continue
+                new_ids.append(entry_id)
+
+            if prepared:
+                self.insert_transactions(conn, prepared)
+                applied_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self.executemany_with_reconnect(conn, """
+                INSERT INTO applied_journal_entries (entry_id, applied_on)
+                VALUES (?, ?)
+                """, [(entry_id, applied_on) for entry_id in new_ids])
+                conn.commit()
+
+        return applied + new_ids, rejected
+
+    def get_import_checkpoint(self, source):
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, """
+            SELECT byte_offset, line_number, imported, rejected FROM import_checkpoints
+            WHERE source = ?
+            """, (source,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return {'source': source, 'offset': row[0], 'line': row[1], 'imported': row[2], 'rejected': row[3]}
+
+    def add_import_chunk(self, transactions, checkpoint, previous_offset):
+        # Inserts a chunk of an import and moves its checkpoint forward in the same transaction, so a
+        # crash either keeps both or neither. The checkpoint only moves on from previous_offset (None for
+        # a source with no checkpoint yet): if another run got there first, nothing is inserted and
+        # ValueError is raised.
+        prepared = [self.prepare_transaction(**transaction) for transaction in transactions]
+        updated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        values = (checkpoint['offset'], checkpoint['line'], checkpoint['imported'], checkpoint['rejected'], updated_on)
+
+        with self.connection() as conn:
+            if previous_offset is not None:
+                cursor = self.execute_with_reconnect(conn, """
+                UPDATE import_checkpoints
+                SET byte_offset = ?, line_number = ?, imported = ?, rejected = ?, updated_on = ?
+                WHERE source = ? AND byte_offset = ?
+                """, values + (checkpoint['source'], previous_offset))
+                if cursor.rowcount != 1:
+                    raise ValueError(f"{checkpoint['source']} was imported past byte {previous_offset} by another run")
             else:
-                cursor = self.execute_with_reconnect("""
-                SELECT id, registration_date, currency, description, amount, transaction_type,
-                       document_name, document_size
-                FROM transactions 
-                WHERE deleted = 0
-                """)
-            return cursor.fetchall()
-        except pyodbc.Error as e:
+                try:
+                    self.execute_with_reconnect(conn, """
+                    INSERT INTO import_checkpoints (byte_offset, line_number, imported, rejected, updated_on, source)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """, values + (checkpoint['source'],))
+                except self.backend.IntegrityError:
+                    raise ValueError(f"{checkpoint['source']} is already being imported by another run")
+
+            if prepared:
+                self.insert_transactions(conn, prepared)
+            conn.commit()
+
+    def reset_import_checkpoint(self, source):
+        with self.connection() as conn:
+            self.execute_with_reconnect(conn, "DELETE FROM import_checkpoints WHERE source = ?", (source,))
+            conn.commit()
+
+    def iter_transactions(self, include_deleted=False, batch_size=500):
+        query = """
+        SELECT id, registration_date, currency, description, amount, transaction_type,
+               document_name, document_size
+        FROM transactions
+        """
+        if not include_deleted:
+            query += " WHERE deleted = 0"
+        query += " ORDER BY registration_date, id"
+
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, query)
+            yield from self._iter_batches(cursor, batch_size)
+
+    def get_transactions(self, include_deleted=False):
+        try:
+            return list(self.iter_transactions(include_deleted))
+        except self.backend.Error as e:
             print(f"Error getting transactions: {e}")
             return []
 
-    def get_document(self, transaction_id):
+    def store_document(self, conn, document_hash, document, document_size=None, thumbnail=None, width=None, height=None):
+        # Bump the reference first so an already stored document never has its bytes re-sent
+        cursor = self.execute_with_reconnect(conn, """
+        UPDATE documents SET ref_count = ref_count + 1, thumbnail = COALESCE(thumbnail, ?)
+        WHERE document_hash = ?
+        """, (thumbnail, document_hash))
+        if cursor.rowcount > 0:
+            return
+
+        if document_size is None:
+            document_size = os.path.getsize(document) if isinstance(document, str) else len(document)
+        blob_sql, blob_params = self.backend.empty_blob(document_size)
         try:
-            cursor = self.execute_with_reconnect("""
-            SELECT document, document_name, document_hash 
-            FROM transactions 
+            self.execute_with_reconnect(conn, f"""
+            INSERT INTO documents (document_hash, data, size, ref_count, created_on, thumbnail, width, height)
+            VALUES (?, {blob_sql}, ?, 1, ?, ?, ?, ?)
+            """, (document_hash, *blob_params, document_size, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                  thumbnail, width, height))
+        except self.backend.IntegrityError:
+            self.execute_with_reconnect(conn, """
+            UPDATE documents SET ref_count = ref_count + 1, thumbnail = COALESCE(thumbnail, ?)
+            WHERE document_hash = ?
+            """, (thumbnail, document_hash))
+            return
+
+        # The bytes follow one chunk at a time and are hashed again on the way, so a file that changed
+        # since it was attached cannot be stored under the wrong hash
+        hasher = hashlib.sha256()
+
+        def chunks():
+            for chunk in self.iter_document_source(document):
+                hasher.update(chunk)
+                yield chunk
+
+        self.backend.write_blob_chunks(conn.conn, document_hash, chunks())
+        conn.pending_statements += 1
+        if hasher.hexdigest() != document_hash:
+            raise ValueError("Document changed while it was being stored")
+
+    def _copy_stored_document(self, conn, document_hash, target, hasher):
+        found = False
+        for chunk in self.backend.read_blob_chunks(conn.conn, document_hash, self.document_chunk_size):
+            hasher.update(chunk)
+            target.write(chunk)
+            found = True
+        return found
+
+    def copy_stored_document(self, document_hash, target):
+        # Like copy_document, by hash; returns whether a verified copy was written
+        hasher = hashlib.sha256()
+        with self.connection() as conn:
+            found = self._copy_stored_document(conn, document_hash, target, hasher)
+        if found and hasher.hexdigest() != document_hash:
+            print("Document hash verification failed")
+            return False
+        return found
+
+    def get_document_thumbnails(self, document_hashes, chunk_size=200):
+        # Returns {document_hash: thumbnail bytes} for the stored documents that have one
+        thumbnails = {}
+        document_hashes = list(document_hashes)
+        with self.connection() as conn:
+            for start in range(0, len(document_hashes), chunk_size):
+                chunk = document_hashes[start:start + chunk_size]
+                cursor = self.execute_with_reconnect(conn, f"""
+                SELECT document_hash, thumbnail FROM documents
+                WHERE thumbnail IS NOT NULL AND document_hash IN ({', '.join('?' * len(chunk))})
+                """, chunk)
+                for document_hash, thumbnail in cursor.fetchall():
+                    thumbnails[document_hash] = bytes(thumbnail)
+        return thumbnails
+
+    def set_document_thumbnail(self, document_hash, thumbnail):
+        with self.connection() as conn:
+            self.execute_with_reconnect(conn, """
+            UPDATE documents SET thumbnail = ?
+            WHERE document_hash = ? AND thumbnail IS NULL
+            """, (thumbnail, document_hash))
+            conn.commit()
+
+    def copy_document(self, transaction_id, target):
+        # Streams a transaction's document into the binary file object target, verifying its hash as
+        # it goes. Returns the document name, or None when there is no document or it fails verification.
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, """
+            SELECT document_name, document_hash FROM transactions
             WHERE id = ? AND deleted = 0
             """, (transaction_id,))
             result = cursor.fetchone()
-            if result:
-                calculated_hash = self.hash_document(result[0])
-                if calculated_hash == result[2]:
-                    return result[0], result[1]
-                else:
-                    print("Document hash verification failed")
-                    return None, None
-            return None, None
-        except pyodbc.Error as e:
+            if not result or not result[1]:
+                return None
+
+            hasher = hashlib.sha256()
+            if not self._copy_stored_document(conn, result[1], target, hasher):
+                # Rows from before the document store may still keep their bytes inline
+                cursor = self.execute_with_reconnect(conn, "SELECT document FROM transactions WHERE id = ?", (transaction_id,))
+                inline = cursor.fetchone()
+                if not inline or inline[0] is None:
+                    return None
+                hasher.update(inline[0])
+                target.write(inline[0])
+
+        if hasher.hexdigest() != result[1]:
+            print("Document hash verification failed")
+            return None
+        return result[0]
+
+    def get_document(self, transaction_id):
+        try:
+            buffer = io.BytesIO()
+            document_name = self.copy_document(transaction_id, buffer)
+            if document_name is None:
+                return None, None
+            return buffer.getvalue(), document_name
+        except self.backend.Error as e:
             print(f"Error getting document: {e}")
             return None, None
 
     def soft_delete_transaction(self, transaction_id, user_id=None):
         try:
-            cursor = self.execute_with_reconnect("""
-            UPDATE transactions 
-            SET deleted = 1, deleted_date = ?, deleted_by=?
-            WHERE id = ?
-            """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user_id, transaction_id))
-            self.conn.commit()
-            return True
-        except pyodbc.Error as e:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                UPDATE transactions 
+                SET deleted = 1, deleted_date = ?, deleted_by=?
+                WHERE id = ? AND deleted = 0
+                """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user_id, transaction_id))
+                if cursor.rowcount > 0:
+                    cursor = self.execute_with_reconnect(conn, """
+                    SELECT registration_date, currency, amount, transaction_type, document_hash
+                    FROM transactions WHERE id = ?
+                    """, (transaction_id,))
+                    row = cursor.fetchone()
+                    self.record_ledger_changes(conn, [tuple(row[:4])], -1)
+                    if row[4]:
+                        self.execute_with_reconnect(conn, """
+                        UPDATE documents SET ref_count = ref_count - 1
+                        WHERE document_hash = ?
+                        """, (row[4],))
+                conn.commit()
+                return True
+        except self.backend.Error as e:
             print(f"Error soft deleting transaction: {e}")
             return False
 
+    def soft_delete_transactions(self, transaction_ids, user_id=None, chunk_size=500, max_attempts=3):
+        # Deletes every id in one transaction, a chunked IN list at a time, with one set of ledger and
+        # document reference updates for the whole batch. Returns how many transactions were deleted;
+        # ids that do not exist or were already deleted are skipped.
+        transaction_ids = list(dict.fromkeys(transaction_ids))
+        if not transaction_ids:
+            return 0
+
+        deleted_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with self.connection() as conn:
+                for attempt in range(max_attempts):
+                    entries = []
+                    document_refs = {}
+                    raced = False
+                    for start in range(0, len(transaction_ids), chunk_size):
+                        chunk = transaction_ids[start:start + chunk_size]
+                        placeholders = ', '.join('?' * len(chunk))
+                        cursor = self.execute_with_reconnect(conn, f"""
+                        SELECT id, registration_date, currency, amount, transaction_type, document_hash
+                        FROM transactions WHERE deleted = 0 AND id IN ({placeholders})
+                        """, chunk)
+                        rows = cursor.fetchall()
+                        if not rows:
+                            continue
+
+                        live_ids = [row[0] for row in rows]
+                        cursor = self.execute_with_reconnect(conn, f"""
+                        UPDATE transactions
+                        SET deleted = 1, deleted_date = ?, deleted_by = ?
+                        WHERE deleted = 0 AND id IN ({', '.join('?' * len(live_ids))})
+                        """, [deleted_on, user_id] + live_ids)
+                        if cursor.rowcount != len(live_ids):
+                            # Another client deleted some of these in between; start over on fresh rows
+                            raced = True
+                            break
+
+                        entries.extend(tuple(row[1:5]) for row in rows)
+                        for row in rows:
+                            if row[5]:
+                                document_refs[row[5]] = document_refs.get(row[5], 0) + 1
+
+                    if raced:
+                        conn.rollback()
+                        continue
+
+                    self.record_ledger_changes(conn, entries, -1)
+                    if document_refs:
+                        self.executemany_with_reconnect(conn, """
+                        UPDATE documents SET ref_count = ref_count - ?
+                        WHERE document_hash = ?
+                        """, [(count, document_hash) for document_hash, count in document_refs.items()])
+                    conn.commit()
+                    return len(entries)
+
+                print("Error soft deleting transactions: rows kept changing while deleting")
+                return 0
+        except self.backend.Error as e:
+            print(f"Error soft deleting transactions: {e}")
+            return 0
+
+    def purge_unreferenced_documents(self):
+        try:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, "DELETE FROM documents WHERE ref_count <= 0")
+                conn.commit()
+                return cursor.rowcount
+        except self.backend.Error as e:
+            print(f"Error purging documents: {e}")
+            return 0
+
+    def migrate_inline_documents(self, batch_size=50):
+        # Returns how many documents were moved, or None when the migration failed part-way
+        migrated = 0
+        try:
+            with self.connection() as conn:
+                while True:
+                    cursor = self.execute_with_reconnect(conn, """
+                    SELECT id, document FROM transactions
+                    WHERE document IS NOT NULL
+                    ORDER BY id""" + self.backend.limit_clause, (batch_size,))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+
+                    batch_hashes = set()
+                    for transaction_id, document_data in rows:
+                        document_hash = self.hash_document(document_data)
+                        batch_hashes.add(document_hash)
+                        cursor = self.execute_with_reconnect(conn, "SELECT 1 FROM documents WHERE document_hash = ?", (document_hash,))
+                        if not cursor.fetchone():
+                            self.execute_with_reconnect(conn, """
+                            INSERT INTO documents (document_hash, data, size, ref_count, created_on)
+                            VALUES (?, ?, ?, 0, ?)
+                            """, (document_hash, document_data, len(document_data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                        self.execute_with_reconnect(conn, """
+                        UPDATE transactions
+                        SET document = NULL, document_hash = ?, document_size = ?
+                        WHERE id = ?
+                        """, (document_hash, len(document_data), transaction_id))
+
+                    # Counted in the same transaction as the move, so a batch that committed never
+                    # leaves its documents at ref_count 0 for purge_unreferenced_documents to remove
+                    batch_hashes = list(batch_hashes)
+                    self.execute_with_reconnect(conn, f"""
+                    UPDATE documents SET ref_count = (
+                        SELECT COUNT(*) FROM transactions t
+                        WHERE t.document_hash = documents.document_hash AND t.deleted = 0
+                    )
+                    WHERE document_hash IN ({', '.join('?' * len(batch_hashes))})
+                    """, batch_hashes)
+                    conn.commit()
+                    migrated += len(rows)
+
+                if migrated:
+                    print(f"Moved {migrated} inline documents into the document store")
+        except self.backend.Error as e:
+            print(f"Error migrating documents: {e}")
+            return None
+        return migrated
+
     def get_balances(self):
         try:
-            cursor = self.execute_with_reconnect("""
-            SELECT currency, 
-                   CAST(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END) AS FLOAT) as income,
-                   CAST(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END) AS FLOAT) as expense
-            FROM transactions
-            WHERE deleted = 0
-            GROUP BY currency
-            """)
-            return cursor.fetchall()
-        except pyodbc.Error as e:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                SELECT currency, CAST(income AS FLOAT) as income, CAST(expense AS FLOAT) as expense
+                FROM currency_balances
+                WHERE income <> 0 OR expense <> 0
+                ORDER BY currency
+                """)
+                return cursor.fetchall()
+        except self.backend.Error as e:
             print(f"Error getting balances: {e}")
             return []
 
+    LEDGER_BALANCES_SQL = """
+    SELECT currency, 
+           SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END) as income,
+           SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END) as expense
+    FROM transactions
+    WHERE deleted = 0
+    GROUP BY currency
+    """
+
+    def verify_balances(self):
+        # Returns (currency, stored_income, stored_expense, ledger_income, ledger_expense) for every drifting currency
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, "SELECT currency, income, expense FROM currency_balances")
+            stored = {row[0]: (self.to_money(row[1]), self.to_money(row[2])) for row in cursor.fetchall()}
+            cursor = self.execute_with_reconnect(conn, self.LEDGER_BALANCES_SQL)
+            ledger = {row[0]: (self.to_money(row[1]), self.to_money(row[2])) for row in cursor.fetchall()}
+
+        zero = (Decimal('0'), Decimal('0'))
+        drift = []
+        for currency in sorted(set(stored) | set(ledger)):
+            stored_income, stored_expense = stored.get(currency, zero)
+            ledger_income, ledger_expense = ledger.get(currency, zero)
+            if stored_income != ledger_income or stored_expense != ledger_expense:
+                drift.append((currency, stored_income, stored_expense, ledger_income, ledger_expense))
+        return drift
+
+    def rebuild_balances(self):
+        try:
+            with self.connection() as conn:
+                self.execute_with_reconnect(conn, "DELETE FROM currency_balances")
+                self.execute_with_reconnect(conn, """
+                INSERT INTO currency_balances (currency, income, expense, updated_on)
+                SELECT currency,
+                       SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END),
+                       SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END),
+                       ?
+                FROM transactions
+                WHERE deleted = 0
+                GROUP BY currency
+                """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+                conn.commit()
+                return True
+        except self.backend.Error as e:
+            print(f"Error rebuilding balances: {e}")
+            return False
+
+    def rebuild_daily_rollups(self):
+        day = self.backend.day_sql('registration_date')
+        try:
+            with self.connection() as conn:
+                self.execute_with_reconnect(conn, "DELETE FROM daily_rollups")
+                self.execute_with_reconnect(conn, f"""
+                INSERT INTO daily_rollups (day, currency, transaction_type, total, tx_count)
+                SELECT {day}, currency, transaction_type, SUM(amount), COUNT(*)
+                FROM transactions
+                WHERE deleted = 0
+                GROUP BY {day}, currency, transaction_type
+                """)
+                conn.commit()
+                return True
+        except self.backend.Error as e:
+            print(f"Error rebuilding daily rollups: {e}")
+            return False
+
+    def _balances_as_of(self, conn, cutoff, inclusive):
+        # Whole days come from the rollup; only the cutoff day itself is read from the ledger
+        totals = {}
+        cursor = self.execute_with_reconnect(conn, """
+        SELECT currency, transaction_type, SUM(total)
+        FROM daily_rollups
+        WHERE day < ?
+        GROUP BY currency, transaction_type
+        """, (cutoff[:10],))
+        rows = cursor.fetchall()
+
+        cursor = self.execute_with_reconnect(conn, f"""
+        SELECT currency, transaction_type, SUM(amount)
+        FROM transactions
+        WHERE deleted = 0
+        AND registration_date >= ? AND registration_date {'<=' if inclusive else '<'} ?
+        GROUP BY currency, transaction_type
+        """, (cutoff[:10] + " 00:00:00", cutoff))
+        rows += cursor.fetchall()
+
+        for currency, transaction_type, total in rows:
+            currency_totals = totals.setdefault(currency, {'income': Decimal('0'), 'expense': Decimal('0')})
+            currency_totals[transaction_type] = currency_totals.get(transaction_type, Decimal('0')) + self.to_money(total)
+        return totals
+
+    def get_period_balances(self, from_date, to_date):
+        # Returns {currency: {'opening', 'income', 'expense', 'closing'}} for the inclusive date range
+        with self.connection() as conn:
+            opening = self._balances_as_of(conn, from_date, inclusive=False)
+            closing = self._balances_as_of(conn, to_date, inclusive=True)
+
+        zero = {'income': Decimal('0'), 'expense': Decimal('0')}
+        periods = {}
+        for currency in set(opening) | set(closing):
+            before = opening.get(currency, zero)
+            after = closing.get(currency, zero)
+            periods[currency] = {
+                'opening': before['income'] - before['expense'],
+                'income': after['income'] - before['income'],
+                'expense': after['expense'] - before['expense'],
+                'closing': after['income'] - after['expense']
+            }
+        return periods
+
+    # {amount} is FLOAT_AMOUNT for display, or the stored DECIMAL itself where it must stay exact
+    FLOAT_AMOUNT = "CAST(t.amount AS FLOAT)"
+    FILTERED_TRANSACTION_COLUMNS = """
+        SELECT t.id, t.registration_date, t.currency, t.description, 
+           {amount} as amount, 
+           t.transaction_type,
+           t.created_by,
+           t.deleted_by,
+           t.document_name,
+           t.document_size,
+           t.document_hash
+        FROM transactions t
+    """
+
+    def build_transaction_filter(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None):
+        where = " WHERE t.deleted = 0 AND t.registration_date BETWEEN ? AND ?"
+        params = [from_date, to_date]
+
+        if desc_filter:
+            # Narrow to descriptions containing every trigram of the term, then confirm the substring.
+            # Rows written by clients that predate the index have no hash and are checked by LIKE alone.
+            grams = sorted(description_index.trigrams(desc_filter))
+            if grams:
+                where += f""" AND (t.description_hash IN (
+                    SELECT description_hash FROM description_terms
+                    WHERE kind = '{description_index.TRIGRAM}' AND term IN ({', '.join('?' * len(grams))})
+                    GROUP BY description_hash
+                    HAVING COUNT(*) = ?
+                ) OR t.description_hash IS NULL)"""
+                params.extend(grams)
+                params.append(len(grams))
+            where += " AND LOWER(t.description) LIKE ?"
+            params.append(f"%{desc_filter.lower()}%")
+
+        if currency_filter and currency_filter != 'All':
+            where += " AND t.currency = ?"
+            params.append(currency_filter)
+
+        if type_filter and type_filter != 'All':
+            where += " AND t.transaction_type = ?"
+            params.append(type_filter.lower())
+
+        return where, params
+
+    @staticmethod
+    def _iter_batches(cursor, batch_size):
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def build_relevance_rank(self, desc_filter):
+        # Exact description, then prefix, then whole-word match, then any other substring match
+        term = description_index.normalize(desc_filter)
+        rank = f"""CASE
+            WHEN LOWER(t.description) = ? THEN 0
+            WHEN LOWER(t.description) LIKE ? THEN 1
+            WHEN t.description_hash IN (
+                SELECT description_hash FROM description_terms
+                WHERE kind = '{description_index.TOKEN}' AND term = ?
+            ) THEN 2
+            ELSE 3
+        END"""
+        return rank, [term, f"{term}%", term]
+
+    def build_relevance_order(self, desc_filter):
+        rank, params = self.build_relevance_rank(desc_filter)
+        return f" ORDER BY {rank}, t.registration_date, t.id", params
+
+    def iter_filtered_transactions(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None, batch_size=500, order_by_relevance=False, exact_amounts=False):
+        # exact_amounts returns t.amount as stored (Decimal on SQL Server) instead of as a float
+        where, params = self.build_transaction_filter(from_date, to_date, desc_filter, currency_filter, type_filter)
+        columns = self.FILTERED_TRANSACTION_COLUMNS.format(amount='t.amount' if exact_amounts else self.FLOAT_AMOUNT)
+        if desc_filter and order_by_relevance:
+            order, order_params = self.build_relevance_order(desc_filter)
+            query = columns + where + order
+            params.extend(order_params)
+        else:
+            query = columns + where + " ORDER BY t.registration_date, t.id"
+
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, query, params)
+            yield from self.resolve_user_names(self._iter_batches(cursor, batch_size))
+
     def get_filtered_transactions(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None):
         try:
-            query = """
-            SELECT t.id, t.registration_date, t.currency, t.description, 
-               CAST(t.amount AS FLOAT) as amount, 
-               t.transaction_type,
-               u.username as created_by,
-               u2.username as deleted_by,
-               t.document_name,
-               t.document_size
-            FROM transactions t
-            LEFT JOIN users u ON t.created_by = u.id
-            LEFT JOIN users u2 ON t.deleted_by = u2.id
-            WHERE t.deleted = 0
-            AND t.registration_date BETWEEN ? AND ?
-            """
-            params = [from_date, to_date]
-            
-            if desc_filter:
-                query += " AND LOWER(description) LIKE ?"
-                params.append(f"%{desc_filter.lower()}%")
-                
-            if currency_filter and currency_filter != 'All':
-                query += " AND currency = ?"
-                params.append(currency_filter)
-                
-            if type_filter and type_filter != 'All':
-                query += " AND transaction_type = ?"
-                params.append(type_filter.lower())
-                
-            cursor = self.execute_with_reconnect(query, params)
-            return cursor.fetchall()
-        except pyodbc.Error as e:
+            return list(self.iter_filtered_transactions(from_date, to_date, desc_filter, currency_filter, type_filter))
+        except self.backend.Error as e:
             print(f"Error getting filtered transactions: {e}")
             return []
 
+    def get_filtered_totals(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None):
+        # Per-currency sums over the same filters as iter_filtered_transactions, in one grouped query
+        where, params = self.build_transaction_filter(from_date, to_date, desc_filter, currency_filter, type_filter)
+        query = """
+        SELECT t.currency, t.transaction_type, SUM(t.amount), COUNT(*)
+        FROM transactions t
+        """ + where + " GROUP BY t.currency, t.transaction_type"
+
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, query, params)
+            return self.summarize_totals(cursor.fetchall())
+
+    @classmethod
+    def summarize_totals(cls, rows):
+        # (currency, transaction_type, total, count) rows -> {currency: {'income', 'expense', 'count'}}
+        totals = {}
+        for currency, transaction_type, total, count in rows:
+            entry = totals.setdefault(currency, {'income': Decimal('0'), 'expense': Decimal('0'), 'count': 0})
+            entry[transaction_type] += cls.to_money(total)
+            entry['count'] += count
+        return totals
+
+    def get_transactions_page(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None, after=None, limit=500, relevance_rank=None):
+        where, params = self.build_transaction_filter(from_date, to_date, desc_filter, currency_filter, type_filter)
+
+        # Relevance order is paged one rank of build_relevance_rank at a time, each in keyset order
+        if desc_filter and relevance_rank is not None:
+            rank, rank_params = self.build_relevance_rank(desc_filter)
+            where += f" AND {rank} = ?"
+            params.extend(rank_params)
+            params.append(relevance_rank)
+
+        # Keyset pagination: `after` is the (registration_date, id) of the last row already seen
+        if after:
+            where += " AND (t.registration_date > ? OR (t.registration_date = ? AND t.id > ?))"
+            params.extend([after[0], after[0], after[1]])
+
+        query = (self.FILTERED_TRANSACTION_COLUMNS.format(amount=self.FLOAT_AMOUNT) + where +
+                 " ORDER BY t.registration_date, t.id" + self.backend.limit_clause)
+        params.append(limit)
+
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, query, params)
+            rows = cursor.fetchall()
+        return list(self.resolve_user_names(rows))
+
+    CHANGED_TRANSACTION_COLUMNS = """
+        SELECT t.id, t.registration_date, t.currency, t.description, 
+           CAST(t.amount AS FLOAT) as amount, 
+           t.transaction_type,
+           t.created_by,
+           t.deleted_by,
+           t.document_name,
+           t.document_size,
+           t.document_hash,
+           t.deleted,
+           t.description_hash,
+           {change_seq} as change_seq
+        FROM transactions t
+    """
+
+    def get_transaction_changes(self, after=0, limit=1000):
+        # Rows inserted, edited or soft-deleted since the `after` change sequence, oldest change first
+        query = (self.CHANGED_TRANSACTION_COLUMNS.format(change_seq=self.backend.change_seq_column) +
+                 " WHERE " + self.backend.change_filter +
+                 " ORDER BY " + self.backend.change_seq_order + self.backend.limit_clause)
+
+        with self.connection() as conn:
+            cursor = self.execute_with_reconnect(conn, query, (after, limit))
+            return cursor.fetchall()
+
     def create_user(self, username, password, role, can_upload=False):
         try:
-            cursor = self.execute_with_reconnect("""
-            INSERT INTO users (username, password, role, can_upload_documents)
-            VALUES (?, ?, ?, ?)
-            """, (username, self.hash_password(password), role, 1 if can_upload else 0))
-            self.conn.commit()
-            return True
-        except pyodbc.IntegrityError:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                INSERT INTO users (username, password, role, can_upload_documents)
+                VALUES (?, ?, ?, ?)
+                """, (username, self.hash_password(password), role, 1 if can_upload else 0))
+                conn.commit()
+                self.invalidate_user_directory()
+                return True
+        except self.backend.IntegrityError:
             return False
-        except pyodbc.Error as e:
+        except self.backend.Error as e:
             print(f"Error creating user: {e}")
             return False
 
     def change_password(self, user_id, new_password):
         try:
-            cursor = self.execute_with_reconnect("""
-            UPDATE users SET password = ? 
-            WHERE id = ?
-            """, (self.hash_password(new_password), user_id))
-            self.conn.commit()
-            return cursor.rowcount > 0
-        except pyodbc.Error as e:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                UPDATE users SET password = ? 
+                WHERE id = ?
+                """, (self.hash_password(new_password), user_id))
+                conn.commit()
+                self.invalidate_user_directory()
+                return cursor.rowcount > 0
+        except self.backend.Error as e:
             print(f"Error changing password: {e}")
             return False
 
     def change_upload_permission(self, user_id, can_upload):
         try:
-            cursor = self.execute_with_reconnect("""
-            UPDATE users SET can_upload_documents = ? 
-            WHERE id = ?
-            """, (1 if can_upload else 0, user_id))
-            self.conn.commit()
-            return cursor.rowcount > 0
-        except pyodbc.Error as e:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                UPDATE users SET can_upload_documents = ? 
+                WHERE id = ?
+                """, (1 if can_upload else 0, user_id))
+                conn.commit()
+                self.invalidate_user_directory()
+                return cursor.rowcount > 0
+        except self.backend.Error as e:
             print(f"Error changing upload permissions: {e}")
             return False
 
     def get_all_users(self):
         try:
-            cursor = self.execute_with_reconnect("""
-            SELECT id, username, role, can_upload_documents 
-            FROM users 
-            ORDER BY username
-            """)
-            return cursor.fetchall()
-        except pyodbc.Error as e:
+            with self.connection() as conn:
+                cursor = self.execute_with_reconnect(conn, """
+                SELECT id, username, role, can_upload_documents 
+                FROM users 
+                ORDER BY username
+                """)
+                return cursor.fetchall()
+        except self.backend.Error as e:
             print(f"Error getting all users: {e}")
             return []
 
     def close(self):
         try:
-            if self.conn:
-                self.conn.close()
-        except pyodbc.Error as e:
+            self.pool.close_all()
+        except self.backend.Error as e:
             print(f"Error closing connection: {e}")
\ No newline at end of file
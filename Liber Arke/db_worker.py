@@ -0,0 +1,95 @@
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DbWorker:
+    # Runs database calls off the Tk thread. submit() must be called from the Tk thread, and every
+    # callback (on_success, on_error, posted calls, busy listeners) is delivered back on it by polling
+    # a result queue with root.after, so no worker thread ever touches a widget.
+    def __init__(self, root, max_workers=3, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ArkaDb')
+        self._results = queue.Queue()
+        self._active = []
+        self._polling = False
+        self._listeners = []
+
+        self.logger = logging.getLogger('ARKA.DbWorker')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_worker.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+    def add_busy_listener(self, listener):
+        self._listeners.append(listener)
+
+    @property
+    def busy(self):
+        return bool(self._active)
+
+    def submit(self, fn, *args, on_success=None, on_error=None, status=None, **kwargs):
+        future = self.executor.submit(fn, *args, **kwargs)
+        job = (future, on_success, on_error, status)
+        self._active.append(status)
+        future.add_done_callback(lambda f: self._results.put(('done', job)))
+        self._notify()
+        self._schedule_poll()
+        return future
+
+    def post(self, callback, *args):
+        # Called from inside a running job to hand partial results to the Tk thread
+        self._results.put(('call', (callback, args)))
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                kind, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'call':
+                callback, args = payload
+                self._run(callback, *args)
+            else:
+                self._finish(*payload)
+
+        if self._active:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+    def _finish(self, future, on_success, on_error, status):
+        self._active.remove(status)
+        self._notify()
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            if on_success:
+                self._run(on_success, future.result())
+        elif on_error:
+            self._run(on_error, error)
+        else:
+            self.logger.error(f"Background job failed: {error}", exc_info=error)
+
+    def _notify(self):
+        status = next((label for label in reversed(self._active) if label), None)
+        for listener in self._listeners:
+            self._run(listener, len(self._active), status)
+
+    def _run(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            self.logger.error(f"Callback {getattr(callback, '__name__', callback)} failed: {e}", exc_info=True)
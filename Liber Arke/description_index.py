@@ -0,0 +1,45 @@
+import hashlib
+import re
+
+TOKEN = 't'
+TRIGRAM = 'g'
+MAX_TERM_LENGTH = 64
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def description_hash(description):
+    return hashlib.sha256(normalize(description).encode('utf-8')).hexdigest()
+
+
+def tokens(text):
+    return {token[:MAX_TERM_LENGTH] for token in _word_re.findall(normalize(text))}
+
+
+def trigrams(text):
+    text = normalize(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def terms_for(description):
+    # (kind, term) pairs stored for one distinct description
+    terms = {(TOKEN, token) for token in tokens(description)}
+    terms.update((TRIGRAM, gram) for gram in trigrams(description))
+    return terms
+
+
+def relevance(description, term):
+    # Same ranking as the report query: exact, prefix, whole word, then any other substring match
+    text = normalize(description)
+    term = normalize(term)
+    if text == term:
+        return 0
+    if text.startswith(term):
+        return 1
+    if term in tokens(text):
+        return 2
+    return 3
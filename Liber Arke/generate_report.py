@@ -1,7 +1,6 @@
 ﻿import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
-import csv
 from tkcalendar import Calendar
 import tempfile
 import os
@@ -10,6 +9,12 @@ import subprocess
 import logging
 from PIL import Image, ImageTk
 import shutil
+import io
+from circuit_breaker import CircuitOpenError
+from thumbnail_cache import ThumbnailCache
+from virtual_tree import VirtualTreeview, RowSource, PagedRowSource
+from report_export import ReportExporter
+from columnar import ColumnarRows
 
 class GenerateReportTab:
     def __init__(self, app):
@@ -27,6 +32,15 @@ class GenerateReportTab:
         self.max_bytes_per_pixel = 3
         
         self.temp_files = []
+        self.report_request = 0
+        self.report_batch_size = 500
+        self.report_filters = None
+        
+        self.thumbnail_cache = ThumbnailCache(app.db)
+        self.thumbnail_size = 32
+        self.report_thumbnails = {}
+        self.thumbnail_requests = set()
+        self.thumbnail_job = None
         self.create_widgets()
 
     def create_widgets(self):
@@ -107,33 +121,67 @@ class GenerateReportTab:
         tree_frame = ttk.Frame(main_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # Rows are tall enough for the receipt thumbnail in the tree column
+        ttk.Style().configure('Report.Treeview', rowheight=self.thumbnail_size + 4)
+        self.report_sort_keys = {
+            'Data': lambda row: (row[1], row[0]),
+            'Pershkrimi': lambda row: row[3].lower(),
+            'Valuta': lambda row: row[2],
+            'Shuma': lambda row: float(row[4]),
+            'Dokumenti': lambda row: (row[8] or '').lower()
+        }
+        # The same orders over the NumPy columns the report rows are kept in when NumPy is installed
+        self.report_sort_fields = {
+            'Data': 'registration_date',
+            'Pershkrimi': 'description',
+            'Valuta': 'currency',
+            'Shuma': 'amount',
+            'Dokumenti': 'document_name'
+        }
+        
         income_frame = ttk.LabelFrame(tree_frame, text="HYRJET", padding="5 5 5 5")
         income_frame.grid(row=0, column=0, sticky=tk.NSEW, padx=5, pady=5)
-        self.report_income_tree = ttk.Treeview(income_frame, 
-                                             columns=('Data', 'Pershkrimi', 'Valuta', 'Shuma', 'Dokumenti'), 
-                                             show='headings')
+        self.report_income_view = VirtualTreeview(income_frame, 
+                                              columns=('Data', 'Pershkrimi', 'Valuta', 'Shuma', 'Dokumenti'), 
+                                              format_row=self.format_report_row,
+                                              sort_keys=self.report_sort_keys,
+                                              on_render=self.schedule_thumbnails,
+                                              row_key=lambda row: row[0],
+                                              show='tree headings',
+                                              style='Report.Treeview')
+        self.report_income_tree = self.report_income_view.tree
+        self.report_income_tree.column('#0', width=self.thumbnail_size + 12, stretch=False)
         for col in ('Data', 'Pershkrimi', 'Valuta', 'Shuma', 'Dokumenti'):
             self.report_income_tree.heading(col, text=col)
             self.report_income_tree.column(col, width=120, anchor=tk.CENTER)
         self.report_income_tree.column('Pershkrimi', width=200)
         self.report_income_tree.column('Dokumenti', width=150)
-        self.report_income_tree.pack(fill=tk.BOTH, expand=True)
+        self.report_income_tree.tag_configure('has_doc', foreground='blue')
+        self.report_income_view.pack(fill=tk.BOTH, expand=True)
         
         expense_frame = ttk.LabelFrame(tree_frame, text="DALJET", padding="5 5 5 5")
         expense_frame.grid(row=0, column=1, sticky=tk.NSEW, padx=5, pady=5)
-        self.report_expense_tree = ttk.Treeview(expense_frame, 
-                                              columns=('Data', 'Pershkrimi', 'Valuta', 'Shuma', 'Dokumenti'), 
-                                              show='headings')
+        self.report_expense_view = VirtualTreeview(expense_frame, 
+                                               columns=('Data', 'Pershkrimi', 'Valuta', 'Shuma', 'Dokumenti'), 
+                                               format_row=self.format_report_row,
+                                               sort_keys=self.report_sort_keys,
+                                               on_render=self.schedule_thumbnails,
+                                               row_key=lambda row: row[0],
+                                               show='tree headings',
+                                               style='Report.Treeview')
+        self.report_expense_tree = self.report_expense_view.tree
+        self.report_expense_tree.column('#0', width=self.thumbnail_size + 12, stretch=False)
         for col in ('Data', 'Pershkrimi', 'Valuta', 'Shuma', 'Dokumenti'):
             self.report_expense_tree.heading(col, text=col)
             self.report_expense_tree.column(col, width=120, anchor=tk.CENTER)
         self.report_expense_tree.column('Pershkrimi', width=200)
         self.report_expense_tree.column('Dokumenti', width=150)
-        self.report_expense_tree.pack(fill=tk.BOTH, expand=True)
+        self.report_expense_tree.tag_configure('has_doc', foreground='blue')
+        self.report_expense_view.pack(fill=tk.BOTH, expand=True)
         
         bottom_frame = ttk.Frame(main_frame)
         bottom_frame.pack(fill=tk.X, padx=5, pady=5)
-        ttk.Button(bottom_frame, text="Export to CSV", command=self.export_report_to_csv).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom_frame, text="Export", command=self.export_report).pack(side=tk.LEFT, padx=5)
         self.delete_button = ttk.Button(bottom_frame, text="FSHIJ TRANSAKSION", command=self.delete_selected_transactions)
         self.delete_button.pack(side=tk.LEFT, padx=5)
         
@@ -157,14 +205,24 @@ class GenerateReportTab:
             balance_var = tk.StringVar()
             ttk.Label(frame, textvariable=balance_var, font=('Segoe UI', 10, 'bold')).pack(side=tk.LEFT, padx=10)
             
+            opening_var = tk.StringVar()
+            ttk.Label(frame, textvariable=opening_var, font=('Segoe UI', 10)).pack(side=tk.LEFT, padx=10)
+            
+            closing_var = tk.StringVar()
+            ttk.Label(frame, textvariable=closing_var, font=('Segoe UI', 10)).pack(side=tk.LEFT, padx=10)
+            
             self.report_currency_total_vars[currency] = {
                 'income': income_var,
                 'expense': expense_var,
-                'balance': balance_var
+                'balance': balance_var,
+                'opening': opening_var,
+                'closing': closing_var
             }
             income_var.set(f"Income: 0.00 {currency}")
             expense_var.set(f"Expense: 0.00 {currency}")
             balance_var.set(f"Balance: 0.00 {currency}")
+            opening_var.set(f"Opening: 0.00 {currency}")
+            closing_var.set(f"Closing: 0.00 {currency}")
         
         tree_frame.columnconfigure(0, weight=1)
         tree_frame.columnconfigure(1, weight=1)
@@ -197,9 +255,9 @@ class GenerateReportTab:
         ttk.Button(top, text="OK", command=set_date).pack(pady=5)
 
     def generate_report(self):
-        if not self.app.check_db_connection():
-            return
-            
+        self.app.check_db_connection(self.start_report)
+
+    def start_report(self):
         from_date_str = self.report_from_date.get()
         to_date_str = self.report_to_date.get()
         desc_filter = self.report_desc_filter.get()
@@ -220,70 +278,194 @@ class GenerateReportTab:
             messagebox.showerror("Error", "Invalid date format. Please use DD-MM-YYYY HH:MM")
             return
         
-        for item in self.report_income_tree.get_children():
-            self.report_income_tree.delete(item)
-        for item in self.report_expense_tree.get_children():
-            self.report_expense_tree.delete(item)
+        self.report_thumbnails = {}
+        self.report_filters = (from_date, to_date, desc_filter, currency_filter, type_filter)
+        
+        # A newer report supersedes this one: its pages still in flight are dropped
+        self.report_request += 1
+        request = self.report_request
+        # Totals come from one grouped query, so they show up before the detail rows finish loading
+        self.app.db_worker.submit(
+            self.load_report_summary,
+            from_date, to_date, desc_filter, currency_filter, type_filter,
+            on_success=lambda summary: self.show_report_summary(request, summary),
+            on_error=lambda e: self.report_summary_failed(request, e),
+            status="Loading report totals"
+        )
         
-        currency_totals = {curr: {'income': 0.0, 'expense': 0.0} for curr in self.app.currencies}
+        # Each side pages its own transaction type in as the user scrolls
+        query = {
+            'from_date': from_date,
+            'to_date': to_date,
+            'desc_filter': desc_filter,
+            'currency_filter': currency_filter
+        }
+        for view, transaction_type in ((self.report_income_view, 'income'), (self.report_expense_view, 'expense')):
+            if type_filter.lower() in ('all', transaction_type):
+                view.set_source(PagedRowSource(
+                    self.app.db_worker,
+                    lambda cursor, limit, t=transaction_type: self.fetch_report_page(query, t, cursor, limit),
+                    page_size=self.report_batch_size,
+                    status="Loading report",
+                    on_error=lambda e: self.report_failed(request, e),
+                    columns=ColumnarRows() if ColumnarRows.available() else None,
+                    sort_fields=self.report_sort_fields
+                ))
+            else:
+                view.set_source(RowSource())
+
+    def report_source(self):
+        if not self.app.replica:
+            return self.app.db
+        try:
+            self.app.replica.sync()
+            return self.app.replica
+        except CircuitOpenError as e:
+            # Offline: the last synced copy is better than no report at all
+            self.logger.warning(f"Server unavailable, reporting from the local replica: {str(e)}")
+            return self.app.replica
+        except Exception as e:
+            self.logger.warning(f"Local replica unavailable, reading the report from the server: {str(e)}")
+            return self.app.db
+
+    def load_report_summary(self, from_date, to_date, desc_filter, currency_filter, type_filter):
+        totals = self.report_source().get_filtered_totals(from_date, to_date, desc_filter, currency_filter, type_filter)
         
         try:
-            transactions = self.app.db.get_filtered_transactions(
-                from_date, to_date, desc_filter, currency_filter, type_filter
-            )
+            periods = self.app.db.get_period_balances(from_date, to_date)
+        except Exception as e:
+            self.logger.error(f"Failed to load opening/closing balances: {str(e)}")
+            periods = None
+        
+        return totals, periods
+
+    def show_report_summary(self, request, summary):
+        if request != self.report_request:
+            return
             
-            if transactions is None:
-                messagebox.showerror("Error", "Failed to retrieve transactions from database")
-                return
+        totals, periods = summary
+        for currency in self.app.currencies:
+            total = totals.get(currency, {'income': 0, 'expense': 0})
+            income = total['income']
+            expense = total['expense']
+            balance = income - expense
             
-            for transaction in transactions:
-                currency = transaction[2]
-                amount = float(transaction[4])
-                document_name = transaction[8] if len(transaction) > 8 else None
-                document_size = transaction[9] if len(transaction) > 9 else 0
-                
-                doc_info = ""
-                if document_name and document_size:
-                    size_mb = document_size / 1024 / 1024
-                    doc_info = f"{document_name} ({size_mb:.2f}MB)"
-                
-                if transaction[5] == 'income':
-                    currency_totals[currency]['income'] += amount
-                    self.report_income_tree.insert('', tk.END, values=(
-                        transaction[1].strftime("%d-%m-%Y %H:%M"),
-                        transaction[3],
-                        transaction[2],
-                        f"{amount:,.2f}",
-                        doc_info
-                    ), tags=('has_doc',) if doc_info else ())
-                else:
-                    currency_totals[currency]['expense'] += amount
-                    self.report_expense_tree.insert('', tk.END, values=(
-                        transaction[1].strftime("%d-%m-%Y %H:%M"),
-                        transaction[3],
-                        transaction[2],
-                        f"{amount:,.2f}",
-                        doc_info
-                    ), tags=('has_doc',) if doc_info else ())
+            self.report_currency_total_vars[currency]['income'].set(f"Income: {income:,.2f} {currency}")
+            self.report_currency_total_vars[currency]['expense'].set(f"Expense: {expense:,.2f} {currency}")
+            self.report_currency_total_vars[currency]['balance'].set(f"Balance: {balance:,.2f} {currency}")
             
-            for currency in self.app.currencies:
-                income = currency_totals[currency]['income']
-                expense = currency_totals[currency]['expense']
-                balance = income - expense
-                
-                self.report_currency_total_vars[currency]['income'].set(f"Income: {income:,.2f} {currency}")
-                self.report_currency_total_vars[currency]['expense'].set(f"Expense: {expense:,.2f} {currency}")
-                self.report_currency_total_vars[currency]['balance'].set(f"Balance: {balance:,.2f} {currency}")
-                
-            self.report_income_tree.tag_configure('has_doc', foreground='blue')
-            self.report_expense_tree.tag_configure('has_doc', foreground='blue')
+        if periods is not None:
+            self.show_period_balances(periods)
+
+    def report_summary_failed(self, request, error):
+        # The detail query reports its own failure; this only leaves the totals as they were
+        if request == self.report_request:
+            self.logger.error(f"Failed to load report totals: {str(error)}")
+
+    def fetch_report_page(self, query, transaction_type, cursor, limit):
+        # cursor is (relevance rank or None, (registration_date, id) of the last row). With a description
+        # filter the pages walk the relevance ranks in order, each one in date order.
+        source = query.get('source')
+        if source is None:
+            source = query['source'] = self.report_source()
+        
+        if cursor is None:
+            cursor = (0 if query['desc_filter'] else None, None)
+        rank, after = cursor
+        rows = []
+        while True:
+            page = source.get_transactions_page(
+                query['from_date'], query['to_date'], query['desc_filter'], query['currency_filter'],
+                transaction_type, after, limit - len(rows), rank
+            )
+            rows.extend(page)
+            if page:
+                after = (page[-1][1], page[-1][0])
+            if len(rows) >= limit:
+                return rows, (rank, after)
+            if rank is None or rank >= 3:
+                return rows, None
+            rank, after = rank + 1, None
+
+    def format_report_row(self, transaction):
+        document_name = transaction[8] if len(transaction) > 8 else None
+        document_size = transaction[9] if len(transaction) > 9 else 0
+        document_hash = transaction[10] if len(transaction) > 10 else None
+        
+        doc_info = ""
+        if document_name and document_size:
+            size_mb = document_size / 1024 / 1024
+            doc_info = f"{document_name} ({size_mb:.2f}MB)"
+        
+        return {
+            'values': (
+                transaction[1].strftime("%d-%m-%Y %H:%M"),
+                transaction[3],
+                transaction[2],
+                f"{float(transaction[4]):,.2f}",
+                doc_info
+            ),
+            'tags': ('has_doc',) if doc_info else (),
+            'image': self.report_thumbnails.get(document_hash) or ''
+        }
+
+    def schedule_thumbnails(self):
+        # Debounced, so a scroll or a burst of arriving pages costs one lookup
+        if self.thumbnail_job is None:
+            self.thumbnail_job = self.tab.after(150, self.load_visible_thumbnails)
+
+    def load_visible_thumbnails(self):
+        self.thumbnail_job = None
+        wanted = []
+        for view in (self.report_income_view, self.report_expense_view):
+            for transaction in view.visible_rows():
+                document_hash = transaction[10] if len(transaction) > 10 else None
+                if (document_hash and document_hash not in self.report_thumbnails
+                        and document_hash not in self.thumbnail_requests and document_hash not in wanted):
+                    wanted.append(document_hash)
+        
+        if wanted:
+            self.thumbnail_requests.update(wanted)
+            self.app.db_worker.submit(
+                self.thumbnail_cache.get_many,
+                wanted,
+                on_success=self.show_thumbnails,
+                on_error=lambda e: self.thumbnails_failed(wanted, e)
+            )
+
+    def show_thumbnails(self, thumbnails):
+        for document_hash, thumbnail in thumbnails.items():
+            self.thumbnail_requests.discard(document_hash)
+            photo = None
+            if thumbnail:
+                try:
+                    img = Image.open(io.BytesIO(thumbnail))
+                    img.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                    photo = ImageTk.PhotoImage(img)
+                except Exception as e:
+                    self.logger.warning(f"Unreadable thumbnail for document {document_hash}: {str(e)}")
+            # Tk only keeps the image while Python holds a reference to it
+            self.report_thumbnails[document_hash] = photo
+        self.report_income_view.refresh()
+        self.report_expense_view.refresh()
+
+    def thumbnails_failed(self, document_hashes, error):
+        self.thumbnail_requests.difference_update(document_hashes)
+        self.logger.warning(f"Could not load thumbnails: {str(error)}")
+
+    def report_failed(self, request, error):
+        if request != self.report_request:
+            return
             
-            self.logger.info(f"Report generated successfully with {len(transactions)} transactions")
-                
-        except Exception as e:
-            error_msg = f"Failed to generate report: {str(e)}"
-            self.logger.error(error_msg)
-            messagebox.showerror("Error", error_msg)
+        error_msg = f"Failed to generate report: {str(error)}"
+        self.logger.error(error_msg)
+        messagebox.showerror("Error", error_msg)
+
+    def show_period_balances(self, periods):
+        for currency in self.app.currencies:
+            period = periods.get(currency, {'opening': 0, 'closing': 0})
+            self.report_currency_total_vars[currency]['opening'].set(f"Opening: {period['opening']:,.2f} {currency}")
+            self.report_currency_total_vars[currency]['closing'].set(f"Closing: {period['closing']:,.2f} {currency}")
 
     def validate_temp_document(self, file_path):
         try:
@@ -315,73 +497,67 @@ class GenerateReportTab:
     def view_document(self, event):
         try:
             tree = event.widget
-            item = tree.identify_row(event.y)
-            if not item:
+            view = self.report_income_view if tree == self.report_income_tree else self.report_expense_view
+            row = view.row_for_item(tree.identify_row(event.y))
+            if row is None or not row[8]:
                 return
                 
-            values = tree.item(item, 'values')
-            if len(values) < 5 or not values[4]:
-                return
-                
-            try:
-                transaction_id = None
-                cursor = self.app.db.conn.cursor()
-                cursor.execute("""
-                SELECT id FROM transactions 
-                WHERE registration_date = ? 
-                AND description = ?
-                AND currency = ?
-                AND amount = ?
-                AND transaction_type = ?
-                AND document_name LIKE ?
-                AND deleted = 0
-                """, (
-                    datetime.strptime(values[0], "%d-%m-%Y %H:%M").strftime("%Y-%m-%d %H:%M:%S"),
-                    values[1],
-                    values[2],
-                    float(values[3].replace(',', '')),
-                    'income' if tree == self.report_income_tree else 'expense',
-                    f"{values[4].split()[0]}%"
-                ))
-                result = cursor.fetchone()
-                
-                if not result:
-                    raise ValueError("Transaction not found")
-                    
-                document_data, document_name = self.app.db.get_document(result[0])
-                if not document_data:
-                    raise ValueError("Document not found in database")
-                    
-                temp_dir = tempfile.mkdtemp()
-                temp_path = os.path.join(temp_dir, document_name)
-                self.temp_files.append(temp_path)
-                
-                with open(temp_path, 'wb') as f:
-                    f.write(document_data)
-                    
-                if not self.validate_temp_document(temp_path):
-                    raise ValueError("Document failed validation")
-                    
-                self.logger.info(f"Opening document: {document_name} from transaction {result[0]}")
-                
-                try:
-                    img = Image.open(temp_path)
-                    img.show()
-                except Exception as open_error:
-                    raise ValueError(f"Could not open document: {str(open_error)}")
-                    
-                self.tab.after(5000, self.secure_cleanup)
-                
-            except Exception as e:
-                error_msg = f"Could not open document: {str(e)}"
-                self.logger.error(error_msg)
-                messagebox.showerror("Error", error_msg)
-                self.secure_cleanup()
+            self.app.db_worker.submit(
+                self.fetch_document,
+                row[0],
+                on_success=self.open_document,
+                on_error=self.document_failed,
+                status="Loading document"
+            )
                 
         except Exception as outer_error:
             self.logger.error(f"Unexpected error in view_document: {str(outer_error)}")
             messagebox.showerror("Error", "An unexpected error occurred while processing the document")
 
+    def fetch_document(self, transaction_id):
+        # Streamed straight to disk, so only one chunk of the document is ever held in memory
+        temp_dir = tempfile.mkdtemp()
+        download_path = os.path.join(temp_dir, 'download')
+        try:
+            with open(download_path, 'wb') as f:
+                document_name = self.app.db.copy_document(transaction_id, f)
+            if not document_name:
+                raise ValueError("Document not found in database")
+            temp_path = os.path.join(temp_dir, document_name)
+            os.replace(download_path, temp_path)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+            
+        return transaction_id, temp_path, document_name
+
+    def open_document(self, document):
+        transaction_id, temp_path, document_name = document
+        try:
+            self.temp_files.append(temp_path)
+                
+            if not self.validate_temp_document(temp_path):
+                raise ValueError("Document failed validation")
+                
+            self.logger.info(f"Opening document: {document_name} from transaction {transaction_id}")
+            
+            try:
+                img = Image.open(temp_path)
+                img.show()
+            except Exception as open_error:
+                raise ValueError(f"Could not open document: {str(open_error)}")
+                
+            self.tab.after(5000, self.secure_cleanup)
+            
+        except Exception as e:
+            self.document_failed(e)
+
+    def document_failed(self, error):
+        error_msg = f"Could not open document: {str(error)}"
+        self.logger.error(error_msg)
+        messagebox.showerror("Error", error_msg)
+        self.secure_cleanup()
+
     def secure_cleanup(self):
         for temp_path in self.temp_files:
             try:
@@ -395,120 +571,100 @@ class GenerateReportTab:
         self.temp_files = []
 
     def delete_selected_transactions(self):
-        if not self.app.check_db_connection():
-            return
-            
+        self.app.check_db_connection(self.confirm_delete)
+
+    def confirm_delete(self):
         if not hasattr(self.app, 'current_user') or self.app.current_user['role'] != 'admin':
             messagebox.showerror("Permission Denied", "Only admin users can delete transactions")
             return
             
-        income_selected = self.report_income_tree.selection()
-        expense_selected = self.report_expense_tree.selection()
+        income_selected = self.report_income_view.selected_rows()
+        expense_selected = self.report_expense_view.selected_rows()
         
         if not income_selected and not expense_selected:
             messagebox.showwarning("Warning", "No transactions selected for deletion")
             return
         
-        if not messagebox.askyesno("Confirm", "Delete selected transactions?"):
+        totals = self.selection_totals(self.report_income_view, income_selected)
+        for currency, total in self.selection_totals(self.report_expense_view, expense_selected).items():
+            totals.setdefault(currency, {'income': 0, 'expense': 0, 'count': 0})['expense'] += total['expense']
+        summary = "\n".join(
+            f"{currency}: income {total['income']:,.2f}, expense {total['expense']:,.2f}"
+            for currency, total in sorted(totals.items())
+        )
+        count = len(income_selected) + len(expense_selected)
+        if not messagebox.askyesno("Confirm", f"Delete {count} selected transactions?\n\n{summary}"):
             return
         
-        to_delete = []
-        
-        for item in income_selected:
-            values = self.report_income_tree.item(item, 'values')
-            cursor = self.app.db.conn.cursor()
-            cursor.execute("""
-            SELECT id FROM transactions 
-            WHERE registration_date = ? 
-            AND description = ?
-            AND currency = ?
-            AND amount = ?
-            AND transaction_type = 'income'
-            AND deleted = 0
-            """, (
-                datetime.strptime(values[0], "%d-%m-%Y %H:%M").strftime("%Y-%m-%d %H:%M:%S"),
-                values[1],
-                values[2],
-                float(values[3].replace(',', ''))
-            ))
-            result = cursor.fetchone()
-            if result:
-                to_delete.append(result[0])
-        
-        for item in expense_selected:
-            values = self.report_expense_tree.item(item, 'values')
-            cursor = self.app.db.conn.cursor()
-            cursor.execute("""
-            SELECT id FROM transactions 
-            WHERE registration_date = ? 
-            AND description = ?
-            AND currency = ?
-            AND amount = ?
-            AND transaction_type = 'expense'
-            AND deleted = 0
-            """, (
-                datetime.strptime(values[0], "%d-%m-%Y %H:%M").strftime("%Y-%m-%d %H:%M:%S"),
-                values[1],
-                values[2],
-                float(values[3].replace(',', ''))
-            ))
-            result = cursor.fetchone()
-            if result:
-                to_delete.append(result[0])
-        
-        success_count = 0
-        for transaction_id in to_delete:
-            if self.app.db.soft_delete_transaction(transaction_id, self.app.current_user['id']):
-                success_count += 1
+        transaction_ids = [row[0] for row in income_selected + expense_selected]
+        
+        self.delete_button.config(state=tk.DISABLED)
+        self.app.db_worker.submit(
+            self.delete_transactions,
+            transaction_ids, self.app.current_user['id'],
+            on_success=self.on_transactions_deleted,
+            on_error=self.on_delete_failed,
+            status="Deleting transactions"
+        )
+
+    def selection_totals(self, view, rows):
+        columns = getattr(view.source, 'columns', None)
+        if columns is not None:
+            return columns.totals(columns.mask(ids=[row[0] for row in rows]))
+        return self.app.db.summarize_totals((row[2], row[5], row[4], 1) for row in rows)
+
+    def delete_transactions(self, transaction_ids, user_id):
+        return self.app.db.soft_delete_transactions(transaction_ids, user_id), len(transaction_ids)
+
+    def on_transactions_deleted(self, result):
+        self.delete_button.config(state=tk.NORMAL)
+        success_count, total = result
         
         self.logger.info(
-            f"User {self.app.current_user['username']} deleted {success_count} of {len(to_delete)} transactions"
+            f"User {self.app.current_user['username']} deleted {success_count} of {total} transactions"
         )
         
-        messagebox.showinfo("Success", f"Deleted {success_count} of {len(to_delete)} transactions")
+        messagebox.showinfo("Success", f"Deleted {success_count} of {total} transactions")
         self.generate_report()
         self.app.view_balances_tab.update_balances_view()
 
-    def export_report_to_csv(self):
+    def on_delete_failed(self, error):
+        self.delete_button.config(state=tk.NORMAL)
+        error_msg = f"Failed to delete transactions: {str(error)}"
+        self.logger.error(error_msg)
+        messagebox.showerror("Error", error_msg)
+
+    def export_report(self):
+        if not self.report_filters:
+            messagebox.showwarning("Warning", "Generate a report first")
+            return
+            
+        formats = ReportExporter.available_formats()
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv", 
-            filetypes=[("CSV files", "*.csv")],
+            filetypes=[(label, f"*{extension}") for label, extension in formats],
             title="Save Report As"
         )
         if not file_path:
             return
 
-        try:
-            with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    "Date", "Description", "Currency", "Amount", 
-                    "Type", "Document Name", "Document Size (MB)"
-                ])
-
-                for row in self.report_income_tree.get_children():
-                    values = self.report_income_tree.item(row)['values']
-                    doc_info = values[4] if len(values) > 4 else ''
-                    doc_name = doc_info.split()[0] if doc_info else ''
-                    doc_size = doc_info.split('(')[1].split('MB')[0] if doc_info and '(' in doc_info else ''
-                    writer.writerow([
-                        values[0], values[1], values[2], values[3],
-                        'Income', doc_name, doc_size
-                    ])
-
-                for row in self.report_expense_tree.get_children():
-                    values = self.report_expense_tree.item(row)['values']
-                    doc_info = values[4] if len(values) > 4 else ''
-                    doc_name = doc_info.split()[0] if doc_info else ''
-                    doc_size = doc_info.split('(')[1].split('MB')[0] if doc_info and '(' in doc_info else ''
-                    writer.writerow([
-                        values[0], values[1], values[2], values[3],
-                        'Expense', doc_name, doc_size
-                    ])
-
-            self.logger.info(f"Report exported to {file_path}")
-            messagebox.showinfo("Success", "Report exported successfully!")
-        except Exception as e:
-            error_msg = f"Failed to export report: {str(e)}"
-            self.logger.error(error_msg)
-            messagebox.showerror("Error", error_msg)
\ No newline at end of file
+        # Exported straight from the database, not from the grid, so rows never scrolled into view are included
+        self.app.db_worker.submit(
+            self.write_report_export,
+            file_path, self.report_filters,
+            on_success=lambda count: self.report_exported(file_path, count),
+            on_error=self.report_export_failed,
+            status="Exporting report"
+        )
+
+    def write_report_export(self, file_path, filters):
+        return ReportExporter(self.app.db).export(file_path, *filters)
+
+    def report_exported(self, file_path, count):
+        self.logger.info(f"Report exported to {file_path}")
+        messagebox.showinfo("Success", f"Exported {count} transactions")
+
+    def report_export_failed(self, error):
+        error_msg = f"Failed to export report: {str(error)}"
+        self.logger.error(error_msg)
+        messagebox.showerror("Error", error_msg)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+from contextlib import closing
+from storage_backends import SqliteBackend
+import description_index
+
+# Bumped whenever replica_transactions changes shape; an older replica is dropped and pulled again
+REPLICA_SCHEMA_VERSION = 2
+
+REPLICA_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS replica_transactions (
+        id INTEGER NOT NULL PRIMARY KEY,
+        registration_date DATETIME NOT NULL,
+        currency TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount DECIMAL(18, 2) NOT NULL,
+        transaction_type TEXT NOT NULL,
+        created_by INTEGER NULL,
+        deleted_by INTEGER NULL,
+        document_name TEXT NULL,
+        document_size INTEGER NULL,
+        document_hash TEXT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        description_hash TEXT NULL,
+        change_seq INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_replica_report ON replica_transactions (registration_date, id) WHERE deleted = 0",
+]
+
+REPLICA_STATE_TABLE = """
+CREATE TABLE IF NOT EXISTS replica_state (
+    name TEXT NOT NULL PRIMARY KEY,
+    value TEXT NOT NULL
+)
+"""
+
+REPLICA_COLUMNS = (
+    "id, registration_date, currency, description, amount, transaction_type, created_by, deleted_by, "
+    "document_name, document_size, document_hash, deleted, description_hash, change_seq"
+)
+
+
+class LocalReplica:
+    # On-disk SQLite copy of the transactions table that is brought up to date by pulling only the rows
+    # whose change sequence is past the stored watermark. Documents stay on the server.
+    def __init__(self, db, path=None, batch_size=1000):
+        self.db = db
+        self.backend = SqliteBackend(path or os.getenv('LOCAL_REPLICA_PATH', 'arka_replica.db'))
+        self.batch_size = batch_size
+        self._sync_lock = threading.Lock()
+
+        self.logger = logging.getLogger('ARKA.LocalReplica')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_replica.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+        with closing(self.connect()) as conn:
+            conn.execute(REPLICA_STATE_TABLE)
+            source = self._get_state(conn, 'source')
+            schema_version = self._get_state(conn, 'schema_version')
+            if source is not None and schema_version != str(REPLICA_SCHEMA_VERSION):
+                # Replicas from before versioning have no schema_version at all
+                self.logger.warning(f"Replica schema {schema_version or 1} is outdated; rebuilding it")
+                conn.execute("DROP TABLE IF EXISTS replica_transactions")
+            for statement in REPLICA_SCHEMA:
+                conn.execute(statement)
+
+            if source != self.db.backend.source_name() or schema_version != str(REPLICA_SCHEMA_VERSION):
+                if source is not None and source != self.db.backend.source_name():
+                    self.logger.warning(f"Replica belonged to {source}; rebuilding it")
+                self._reset(conn)
+            conn.commit()
+
+    def connect(self):
+        conn = self.backend.connect()
+        conn.create_function('arka_contains', 2, lambda text, term: term in text.lower(), deterministic=True)
+        conn.create_function('arka_relevance', 2, description_index.relevance, deterministic=True)
+        return conn
+
+    def _get_state(self, conn, name):
+        row = conn.execute("SELECT value FROM replica_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn, name, value):
+        conn.execute("INSERT OR REPLACE INTO replica_state (name, value) VALUES (?, ?)", (name, str(value)))
+
+    def _reset(self, conn):
+        conn.execute("DELETE FROM replica_transactions")
+        self._set_state(conn, 'source', self.db.backend.source_name())
+        self._set_state(conn, 'watermark', 0)
+        self._set_state(conn, 'schema_version', REPLICA_SCHEMA_VERSION)
+
+    def reset(self):
+        with self._sync_lock, closing(self.connect()) as conn:
+            self._reset(conn)
+            conn.commit()
+
+    def get_watermark(self):
+        with closing(self.connect()) as conn:
+            return int(self._get_state(conn, 'watermark') or 0)
+
+    def sync(self):
+        # Returns the number of changed rows pulled from the server
+        with self._sync_lock, closing(self.connect()) as conn:
+            watermark = int(self._get_state(conn, 'watermark') or 0)
+            applied = 0
+            while True:
+                rows = self.db.get_transaction_changes(watermark, self.batch_size)
+                if not rows:
+                    break
+
+                # Rows and watermark land in one local transaction, so an interrupted sync resumes cleanly
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO replica_transactions ({REPLICA_COLUMNS}) "
+                    f"VALUES ({', '.join('?' * 14)})",
+                    [tuple(row) for row in rows]
+                )
+                watermark = rows[-1][13]
+                self._set_state(conn, 'watermark', watermark)
+                conn.commit()
+                applied += len(rows)
+
+                if len(rows) < self.batch_size:
+                    break
+
+        if applied:
+            self.logger.info(f"Pulled {applied} changed transactions, watermark now {watermark}")
+        return applied
+
+    def build_transaction_filter(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None):
+        where = " WHERE t.deleted = 0 AND t.registration_date BETWEEN ? AND ?"
+        params = [from_date, to_date]
+
+        if desc_filter:
+            where += " AND arka_contains(t.description, ?)"
+            params.append(desc_filter.lower())
+
+        if currency_filter and currency_filter != 'All':
+            where += " AND t.currency = ?"
+            params.append(currency_filter)
+
+        if type_filter and type_filter != 'All':
+            where += " AND t.transaction_type = ?"
+            params.append(type_filter.lower())
+
+        return where, params
+
+    SELECT_COLUMNS = """
+        SELECT t.id, t.registration_date, t.currency, t.description, CAST(t.amount AS REAL) as amount, t.transaction_type,
+               t.created_by, t.deleted_by, t.document_name, t.document_size, t.document_hash
+        FROM replica_transactions t
+    """
+
+    def get_transactions_page(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None, after=None, limit=500, relevance_rank=None):
+        # Same paging as Database.get_transactions_page
+        where, params = self.build_transaction_filter(from_date, to_date, desc_filter, currency_filter, type_filter)
+        if desc_filter and relevance_rank is not None:
+            where += " AND arka_relevance(t.description, ?) = ?"
+            params.extend([desc_filter, relevance_rank])
+        if after:
+            where += " AND (t.registration_date > ? OR (t.registration_date = ? AND t.id > ?))"
+            params.extend([after[0], after[0], after[1]])
+
+        query = (self.SELECT_COLUMNS + where + " ORDER BY t.registration_date, t.id LIMIT ?")
+        params.append(limit)
+
+        with closing(self.connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return list(self.db.resolve_user_names(rows))
+
+    def get_filtered_totals(self, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None):
+        # Same result as Database.get_filtered_totals
+        where, params = self.build_transaction_filter(from_date, to_date, desc_filter, currency_filter, type_filter)
+        query = """
+        SELECT t.currency, t.transaction_type, SUM(t.amount), COUNT(*)
+        FROM replica_transactions t
+        """ + where + " GROUP BY t.currency, t.transaction_type"
+
+        with closing(self.connect()) as conn:
+            return self.db.summarize_totals(conn.execute(query, params).fetchall())
+
+
+def create_replica(db):
+    # Only worth keeping when the ledger lives on a remote server
+    if db.backend.name == SqliteBackend.name or os.getenv('LOCAL_REPLICA', '1') != '1':
+        return None
+    return LocalReplica(db)
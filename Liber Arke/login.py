@@ -36,10 +36,11 @@ class LoginWindow:
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=2, column=0, columnspan=2, pady=10)
         
-        ttk.Button(button_frame, 
+        self.login_button = ttk.Button(button_frame, 
                  text="Login", 
                  command=self.login,
-                 style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+                 style='Accent.TButton')
+        self.login_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, 
                  text="Cancel", 
                  command=self.on_close).pack(side=tk.LEFT, padx=5)
@@ -56,7 +57,20 @@ class LoginWindow:
             messagebox.showerror("Error", "Please enter both username and password")
             return
         
-        user = self.app.db.authenticate_user(username, password)
+        if str(self.login_button['state']) == tk.DISABLED:
+            return
+        
+        self.login_button.config(state=tk.DISABLED)
+        self.app.db_worker.submit(
+            self.app.db.authenticate_user,
+            username, password,
+            on_success=self.on_authenticated,
+            on_error=self.on_login_failed,
+            status="Signing in"
+        )
+    
+    def on_authenticated(self, user):
+        self.login_button.config(state=tk.NORMAL)
         if user:
             self.app.current_user = {
                 'id': user[0],
@@ -66,9 +80,14 @@ class LoginWindow:
             self.app.update_ui_for_role(user[2])
             self.window.destroy()
             self.app.root.deiconify()
+            self.app.view_balances_tab.update_balances_view()
         else:
             messagebox.showerror("Error", "Invalid username or password")
             self.password_entry.delete(0, tk.END)
     
+    def on_login_failed(self, error):
+        self.login_button.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Login failed: {str(error)}")
+    
     def on_close(self):
         self.app.root.destroy()
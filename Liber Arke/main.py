@@ -1,12 +1,17 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 from add_transaction import AddTransactionTab
 from view_balances import ViewBalancesTab
 from generate_report import GenerateReportTab
 from database import Database
+from db_worker import DbWorker
+from local_replica import create_replica
+from write_journal import WriteJournal
 from login import LoginWindow
 from user_management import UserManagementWindow
+from query_stats_window import QueryStatsWindow
+from csv_import import CsvImporter
 
 class CashMovementApp:
     def __init__(self, root):
@@ -16,11 +21,21 @@ class CashMovementApp:
         self.root.withdraw()
         
         self.db = Database()
+        self.db_worker = DbWorker(root)
+        self.replica = create_replica(self.db)
+        self.journal = WriteJournal()
+        self.journal_replaying = False
+        self.journal_replay_interval = 15000
+        self.csv_importer = None
+        # Actions that were waiting for the database when it went down, run once the circuit closes
+        self.pending_on_connected = []
         self.create_menu()
         self.current_user = None
         self.setup_theme()
         self.currencies = ['EUR', 'USD', 'LEK', 'GBP']
         
+        self.create_status_bar()
+        
         self.main_frame = ttk.Frame(root, padding="10")
         self.main_frame.pack(fill=tk.BOTH, expand=True)
         
@@ -32,26 +47,141 @@ class CashMovementApp:
         self.generate_report_tab = GenerateReportTab(self)
         
         self.show_login()
+        self.schedule_journal_replay()
 
-    def check_db_connection(self):
-        try:
-            if not self.db.check_connection():
-                if not self.db.reconnect():
-                    retry = messagebox.askretrycancel(
-                        "Database Connection Lost",
-                        "Cannot connect to the database. Please check your connection and retry."
-                    )
-                    if retry:
-                        return self.check_db_connection()
-                    return False
-            return True
-        except Exception as e:
+    def create_status_bar(self):
+        status_frame = ttk.Frame(self.root, padding="10 2 10 2")
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(status_frame, textvariable=self.status_var).pack(side=tk.LEFT)
+        
+        self.journal_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.journal_var).pack(side=tk.LEFT, padx=20)
+        self.update_journal_status()
+        
+        self.connection_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.connection_var).pack(side=tk.RIGHT, padx=10)
+        self.connection_state = self.db.circuit.CLOSED
+        self.update_connection_status()
+        
+        self.busy_indicator = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
+        self.busy_indicator.pack(side=tk.RIGHT)
+        
+        self.db_worker.add_busy_listener(self.on_worker_busy)
+
+    def on_worker_busy(self, active_jobs, status):
+        if active_jobs:
+            self.status_var.set(f"{status or 'Working'}...")
+            self.busy_indicator.start(10)
+        else:
+            self.status_var.set("Ready")
+            self.busy_indicator.stop()
+
+    def update_connection_status(self):
+        state, retry_in, _ = self.db.circuit.get_state()
+        if state == self.db.circuit.CLOSED:
+            self.connection_var.set("Database: connected")
+        elif state == self.db.circuit.HALF_OPEN:
+            self.connection_var.set("Database: reconnecting...")
+        else:
+            self.connection_var.set(f"Database: offline, retrying in {retry_in:.0f}s")
+        
+        if state == self.db.circuit.CLOSED and self.connection_state != state:
+            self.replay_journal()
+            pending, self.pending_on_connected = self.pending_on_connected, []
+            for on_connected in pending:
+                self.check_db_connection(on_connected)
+        self.connection_state = state
+        self.root.after(1000, self.update_connection_status)
+
+    def update_journal_status(self):
+        pending = self.journal.pending_count
+        self.journal_var.set(f"{pending} transaction(s) waiting for the server" if pending else "")
+
+    def schedule_journal_replay(self):
+        self.replay_journal()
+        self.root.after(self.journal_replay_interval, self.schedule_journal_replay)
+
+    def replay_journal(self):
+        self.update_journal_status()
+        if self.journal_replaying or not self.journal.pending_count:
+            return
+        
+        self.journal_replaying = True
+        self.db_worker.submit(
+            self.journal.replay,
+            self.db,
+            on_success=self.on_journal_replayed,
+            on_error=self.on_journal_replay_failed,
+            status="Sending queued transactions"
+        )
+
+    def on_journal_replayed(self, result):
+        self.journal_replaying = False
+        self.update_journal_status()
+        
+        if result['rejected']:
+            messagebox.showwarning(
+                "Transactions Rejected",
+                f"{len(result['rejected'])} queued transaction(s) were rejected by the server and saved to "
+                f"{self.journal.rejected_path}:\n\n" +
+                "\n".join(error for _, error in result['rejected'][:10])
+            )
+        if result['applied']:
+            self.view_balances_tab.update_balances_view()
+            self.generate_report_tab.generate_report()
+        
+        # Entries added while this replay was running
+        if self.journal.pending_count:
+            self.replay_journal()
+
+    def on_journal_replay_failed(self, error):
+        self.journal_replaying = False
+        self.update_journal_status()
+        self.journal.logger.warning(f"Journal replay failed, will retry: {str(error)}")
+
+    def ensure_db_connection(self):
+        return self.db.check_connection() or self.db.reconnect()
+
+    def check_db_connection(self, on_connected=None):
+        def on_checked(connected):
+            if connected:
+                if on_connected:
+                    on_connected()
+                return
+            # Reconnecting is left to the circuit breaker's background probe, so nothing waits on it here;
+            # the action is picked up again when the probe closes the circuit
+            if on_connected and on_connected not in self.pending_on_connected:
+                self.pending_on_connected.append(on_connected)
+            retry = messagebox.askretrycancel(
+                "Database Connection Lost",
+                "Cannot connect to the database. ARKA keeps trying in the background and the status bar "
+                "shows when the connection is back. New transactions are kept until then."
+            )
+            if on_connected and on_connected not in self.pending_on_connected:
+                # The connection came back while the dialog was open and already ran the action
+                return
+            if retry:
+                if on_connected:
+                    self.pending_on_connected.remove(on_connected)
+                self.check_db_connection(on_connected)
+            elif not self.current_user:
+                # Still at startup: the main window is hidden, so there is nothing left to wait in
+                self.root.quit()
+
+        def on_error(e):
             messagebox.showerror("Database Error", f"Connection check failed: {str(e)}")
-            return False
+
+        self.db_worker.submit(
+            self.ensure_db_connection,
+            on_success=on_checked,
+            on_error=on_error,
+            status="Connecting to database"
+        )
 
     def show_login(self):
-        if self.check_db_connection():
-            LoginWindow(self)
+        self.check_db_connection(lambda: LoginWindow(self))
 
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -63,6 +193,10 @@ class CashMovementApp:
         self.admin_menu = tk.Menu(menubar, tearoff=0)
         self.admin_menu.add_command(label="User Management", command=self.show_user_management)
         self.admin_menu.add_command(label="Reconnect Database", command=self.check_db_connection)
+        self.admin_menu.add_command(label="Import CSV", command=self.import_csv)
+        self.admin_menu.add_command(label="Verify Balances", command=self.verify_balances)
+        self.admin_menu.add_command(label="Purge Unused Documents", command=self.purge_documents)
+        self.admin_menu.add_command(label="Query Statistics", command=self.show_query_stats)
     
         self.dark_mode_var = tk.BooleanVar(value=False)
         self.admin_menu.add_checkbutton(label="Dark Mode", 
@@ -189,9 +323,6 @@ class CashMovementApp:
         )
 
     def update_ui_for_role(self, role):
-        if not self.check_db_connection():
-            return
-            
         if role != 'admin':
             self.generate_report_tab.delete_button.config(state=tk.DISABLED)
             self.root.config(menu=self.root.children['!menu'])
@@ -202,14 +333,120 @@ class CashMovementApp:
                 self.add_transaction_tab.update_ui_for_role()
 
     def show_user_management(self):
-        if not self.check_db_connection():
-            return
-            
         if hasattr(self, 'current_user') and self.current_user['role'] == 'admin':
-            UserManagementWindow(self)
+            self.check_db_connection(lambda: UserManagementWindow(self))
         else:
             messagebox.showerror("Access Denied", "Only admin users can access this feature")
 
+    def show_query_stats(self):
+        if hasattr(self, 'current_user') and self.current_user and self.current_user['role'] == 'admin':
+            QueryStatsWindow(self)
+        else:
+            messagebox.showerror("Access Denied", "Only admin users can access this feature")
+
+    def import_csv(self):
+        if not hasattr(self, 'current_user') or not self.current_user or self.current_user['role'] != 'admin':
+            messagebox.showerror("Access Denied", "Only admin users can import transactions")
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="Import Cash Movements",
+            filetypes=[("CSV files", "*.csv")]
+        )
+        if not file_path:
+            return
+
+        if self.csv_importer:
+            messagebox.showwarning("Import Running", "Wait for the current import to finish")
+            return
+
+        self.csv_importer = CsvImporter(self.db, file_path, self.current_user['id'])
+        self.db_worker.submit(
+            self.csv_importer.run,
+            on_success=self.on_csv_imported,
+            on_error=self.on_csv_import_failed,
+            status="Importing CSV"
+        )
+
+    def on_csv_import_failed(self, error):
+        self.csv_importer = None
+        messagebox.showerror(
+            "Import Error",
+            f"Import failed: {str(error)}\n\nRun the import again to resume from the last checkpoint."
+        )
+
+    def on_csv_imported(self, summary):
+        self.csv_importer = None
+        message = f"Imported {summary['imported']} transactions, rejected {summary['rejected']} rows."
+        if summary['errors']:
+            message += "\n\n" + "\n".join(f"Line {line}: {error}" for line, error in summary['errors'][:10])
+        messagebox.showinfo("Import Complete", message)
+        self.view_balances_tab.update_balances_view()
+
+    def verify_balances(self):
+        if not hasattr(self, 'current_user') or not self.current_user or self.current_user['role'] != 'admin':
+            messagebox.showerror("Access Denied", "Only admin users can verify balances")
+            return
+
+        self.db_worker.submit(
+            self.db.verify_balances,
+            on_success=self.on_balances_verified,
+            on_error=lambda e: messagebox.showerror("Database Error", f"Balance verification failed: {str(e)}"),
+            status="Verifying balances"
+        )
+
+    def on_balances_verified(self, drift):
+        if not drift:
+            messagebox.showinfo("Balances Verified", "Currency balances match the transaction ledger")
+            return
+
+        lines = [
+            f"{currency}: stored {stored_income:,.2f} / {stored_expense:,.2f}, "
+            f"ledger {ledger_income:,.2f} / {ledger_expense:,.2f}"
+            for currency, stored_income, stored_expense, ledger_income, ledger_expense in drift
+        ]
+        if messagebox.askyesno(
+            "Balance Drift",
+            "Stored balances differ from the ledger (income / expense):\n\n" + "\n".join(lines) +
+            "\n\nRebuild balances from the ledger?"
+        ):
+            self.db_worker.submit(
+                self.db.rebuild_balances,
+                on_success=self.on_balances_rebuilt,
+                status="Rebuilding balances"
+            )
+
+    def on_balances_rebuilt(self, success):
+        if success:
+            messagebox.showinfo("Success", "Balances rebuilt from the ledger")
+            self.view_balances_tab.update_balances_view()
+        else:
+            messagebox.showerror("Error", "Failed to rebuild balances")
+
+    def purge_documents(self):
+        if not hasattr(self, 'current_user') or not self.current_user or self.current_user['role'] != 'admin':
+            messagebox.showerror("Access Denied", "Only admin users can purge documents")
+            return
+
+        if not messagebox.askyesno(
+            "Purge Documents",
+            "Permanently remove stored documents that no active transaction references?"
+        ):
+            return
+
+        self.db_worker.submit(
+            self.db.purge_unreferenced_documents,
+            on_success=lambda count: messagebox.showinfo("Documents Purged", f"Removed {count} unused documents"),
+            on_error=lambda e: messagebox.showerror("Database Error", f"Document purge failed: {str(e)}"),
+            status="Purging documents"
+        )
+
+    def shutdown(self):
+        if self.csv_importer:
+            self.csv_importer.cancel()
+        self.db_worker.shutdown()
+        self.db.close()
+
     def show_about(self):
         messagebox.showinfo("About", "ARKA\nVersion 1.0")
 
@@ -250,4 +487,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = CashMovementApp(root)
     root.mainloop()
-    app.db.close()
\ No newline at end of file
+    app.shutdown()
\ No newline at end of file
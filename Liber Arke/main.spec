@@ -5,8 +5,8 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('database.py', '.'), ('add_transaction.py', '.'), ('view_balances.py', '.'), ('generate_report.py', '.'), ('login.py', '.'), ('user_management.py', '.')],
-    hiddenimports=['tkinter', 'tkinter.ttk', 'pyodbc', 'dotenv', 'hashlib', 'datetime', 'os', 'tkcalendar', 'csv', 'threading', 'time'],
+    datas=[('database.py', '.'), ('add_transaction.py', '.'), ('view_balances.py', '.'), ('generate_report.py', '.'), ('login.py', '.'), ('user_management.py', '.'), ('connection_pool.py', '.'), ('storage_backends.py', '.'), ('migrations.py', '.'), ('csv_import.py', '.'), ('description_index.py', '.'), ('query_stats.py', '.'), ('query_stats_window.py', '.'), ('db_worker.py', '.'), ('local_replica.py', '.'), ('write_journal.py', '.'), ('circuit_breaker.py', '.'), ('thumbnail_cache.py', '.'), ('receipt_ingest.py', '.'), ('virtual_tree.py', '.'), ('report_export.py', '.'), ('columnar.py', '.')],
+    hiddenimports=['tkinter', 'tkinter.ttk', 'pyodbc', 'sqlite3', 'dotenv', 'hashlib', 'datetime', 'os', 'tkcalendar', 'csv', 'json', 'threading', 'time', 'queue', 'concurrent.futures'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
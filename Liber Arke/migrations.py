@@ -0,0 +1,471 @@
+from datetime import datetime
+
+
+SCHEMA_VERSION_TABLE = {
+    'sqlserver': """
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='schema_version' AND xtype='U')
+    BEGIN
+        CREATE TABLE schema_version (
+            version INT NOT NULL PRIMARY KEY,
+            description NVARCHAR(255) NOT NULL,
+            applied_on DATETIME NOT NULL
+        )
+    END
+    """,
+    'sqlite': """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER NOT NULL PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_on DATETIME NOT NULL
+    )
+    """,
+}
+
+
+def _sqlserver_index(name, table, definition):
+    return f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}'))
+    BEGIN
+        CREATE NONCLUSTERED INDEX {name} ON {table} {definition}
+    END
+    """
+
+
+def _migrate_inline_documents(db):
+    if db.migrate_inline_documents() is None:
+        raise RuntimeError("Could not move inline documents into the document store")
+
+
+def _rebuild_balances(db):
+    if not db.rebuild_balances():
+        raise RuntimeError("Could not populate currency_balances")
+
+
+def _add_sqlite_column(table, column, definition):
+    def add_column(db):
+        with db.connection() as conn:
+            cursor = db.execute_with_reconnect(conn, f"PRAGMA table_info({table})")
+            if column not in [row[1] for row in cursor.fetchall()]:
+                db.execute_with_reconnect(conn, f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                conn.commit()
+    return add_column
+
+
+def _rebuild_description_index(db):
+    if db.rebuild_description_index() is None:
+        raise RuntimeError("Could not index transaction descriptions")
+
+
+def _rebuild_daily_rollups(db):
+    if not db.rebuild_daily_rollups():
+        raise RuntimeError("Could not populate daily_rollups")
+
+
+# Every step must be safe to re-run: a migration interrupted half-way is applied again from the top.
+# A step is either SQL text or a callable taking the Database.
+MIGRATIONS = [
+    (1, "Base users and transactions tables", {
+        'sqlserver': [
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='users' AND xtype='U')
+            BEGIN
+                CREATE TABLE users (
+                    id INT IDENTITY(1,1) PRIMARY KEY,
+                    username NVARCHAR(50) NOT NULL UNIQUE,
+                    password NVARCHAR(255) NOT NULL,
+                    role NVARCHAR(20) NOT NULL CHECK (role IN ('admin', 'user')),
+                    created_on DATETIME NOT NULL DEFAULT GETDATE(),
+                    can_upload_documents BIT DEFAULT 0
+                )
+            END
+            """,
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='transactions' AND xtype='U')
+            BEGIN
+                CREATE TABLE transactions (
+                    id INT IDENTITY(1,1) PRIMARY KEY,
+                    registration_date DATETIME NOT NULL,
+                    created_on DATETIME NOT NULL,
+                    currency VARCHAR(10) NOT NULL,
+                    description NVARCHAR(255) NOT NULL,
+                    amount DECIMAL(18, 2) NOT NULL,
+                    transaction_type VARCHAR(10) NOT NULL,
+                    deleted BIT DEFAULT 0,
+                    deleted_date DATETIME NULL,
+                    created_by INT NULL,
+                    deleted_by INT NULL,
+                    document VARBINARY(MAX) NULL,
+                    document_name NVARCHAR(255) NULL,
+                    document_size INT NULL,
+                    document_hash NVARCHAR(64) NULL,
+                    FOREIGN KEY (created_by) REFERENCES users(id),
+                    FOREIGN KEY (deleted_by) REFERENCES users(id)
+                )
+            END
+            """,
+        ],
+        'sqlite': [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL CHECK (role IN ('admin', 'user')),
+                created_on DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                can_upload_documents INTEGER DEFAULT 0
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                registration_date DATETIME NOT NULL,
+                created_on DATETIME NOT NULL,
+                currency TEXT NOT NULL,
+                description TEXT NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
+                transaction_type TEXT NOT NULL,
+                deleted INTEGER DEFAULT 0,
+                deleted_date DATETIME NULL,
+                created_by INTEGER NULL REFERENCES users(id),
+                deleted_by INTEGER NULL REFERENCES users(id),
+                document BLOB NULL,
+                document_name TEXT NULL,
+                document_size INTEGER NULL,
+                document_hash TEXT NULL
+            )
+            """,
+        ],
+    }),
+    (2, "Content-addressed document store", {
+        'sqlserver': [
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='documents' AND xtype='U')
+            BEGIN
+                CREATE TABLE documents (
+                    document_hash NVARCHAR(64) NOT NULL PRIMARY KEY,
+                    data VARBINARY(MAX) NOT NULL,
+                    size INT NOT NULL,
+                    ref_count INT NOT NULL DEFAULT 0,
+                    created_on DATETIME NOT NULL DEFAULT GETDATE()
+                )
+            END
+            """,
+        ],
+        'sqlite': [
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                document_hash TEXT NOT NULL PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                created_on DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+    }),
+    (3, "Move inline transaction documents into the document store", {
+        'sqlserver': [_migrate_inline_documents],
+        'sqlite': [_migrate_inline_documents],
+    }),
+    (4, "Filtered covering index for the report query", {
+        'sqlserver': [
+            _sqlserver_index(
+                'IX_transactions_report', 'transactions',
+                "(registration_date, id) "
+                "INCLUDE (currency, description, amount, transaction_type, created_by, deleted_by, "
+                "document_name, document_size, document_hash) "
+                "WHERE deleted = 0"
+            ),
+        ],
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS ix_transactions_report ON transactions (registration_date) WHERE deleted = 0",
+        ],
+    }),
+    (5, "Filtered covering index for the balance aggregation", {
+        'sqlserver': [
+            _sqlserver_index(
+                'IX_transactions_balance', 'transactions',
+                "(currency, transaction_type) INCLUDE (amount) WHERE deleted = 0"
+            ),
+        ],
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS ix_transactions_balance ON transactions (currency, transaction_type, amount) WHERE deleted = 0",
+        ],
+    }),
+    (6, "Indexes on the created_by and deleted_by user references", {
+        'sqlserver': [
+            _sqlserver_index('IX_transactions_created_by', 'transactions', "(created_by)"),
+            _sqlserver_index('IX_transactions_deleted_by', 'transactions', "(deleted_by) WHERE deleted_by IS NOT NULL"),
+        ],
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS ix_transactions_created_by ON transactions (created_by)",
+            "CREATE INDEX IF NOT EXISTS ix_transactions_deleted_by ON transactions (deleted_by) WHERE deleted_by IS NOT NULL",
+        ],
+    }),
+    (7, "Incrementally maintained per-currency balances", {
+        'sqlserver': [
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='currency_balances' AND xtype='U')
+            BEGIN
+                CREATE TABLE currency_balances (
+                    currency VARCHAR(10) NOT NULL PRIMARY KEY,
+                    income DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                    expense DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                    updated_on DATETIME NULL
+                )
+            END
+            """,
+            _rebuild_balances,
+        ],
+        'sqlite': [
+            """
+            CREATE TABLE IF NOT EXISTS currency_balances (
+                currency TEXT NOT NULL PRIMARY KEY,
+                income DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                expense DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                updated_on DATETIME NULL
+            )
+            """,
+            _rebuild_balances,
+        ],
+    }),
+    (8, "Per-day, per-currency, per-type rollups", {
+        'sqlserver': [
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='daily_rollups' AND xtype='U')
+            BEGIN
+                CREATE TABLE daily_rollups (
+                    day DATE NOT NULL,
+                    currency VARCHAR(10) NOT NULL,
+                    transaction_type VARCHAR(10) NOT NULL,
+                    total DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                    tx_count INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, currency, transaction_type)
+                )
+            END
+            """,
+            _rebuild_daily_rollups,
+        ],
+        'sqlite': [
+            """
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                day DATE NOT NULL,
+                currency TEXT NOT NULL,
+                transaction_type TEXT NOT NULL,
+                total DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                tx_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, currency, transaction_type)
+            )
+            """,
+            _rebuild_daily_rollups,
+        ],
+    }),
+    (9, "Token and trigram index over transaction descriptions", {
+        'sqlserver': [
+            """
+            IF COL_LENGTH('transactions', 'description_hash') IS NULL
+            BEGIN
+                ALTER TABLE transactions ADD description_hash CHAR(64) NULL
+            END
+            """,
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='indexed_descriptions' AND xtype='U')
+            BEGIN
+                CREATE TABLE indexed_descriptions (
+                    description_hash CHAR(64) NOT NULL PRIMARY KEY
+                )
+            END
+            """,
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='description_terms' AND xtype='U')
+            BEGIN
+                CREATE TABLE description_terms (
+                    kind CHAR(1) NOT NULL,
+                    term NVARCHAR(64) COLLATE Latin1_General_BIN2 NOT NULL,
+                    description_hash CHAR(64) NOT NULL,
+                    PRIMARY KEY (kind, term, description_hash)
+                )
+            END
+            """,
+            _sqlserver_index('IX_transactions_description_hash', 'transactions', "(description_hash)"),
+            _rebuild_description_index,
+        ],
+        'sqlite': [
+            _add_sqlite_column('transactions', 'description_hash', 'TEXT NULL'),
+            """
+            CREATE TABLE IF NOT EXISTS indexed_descriptions (
+                description_hash TEXT NOT NULL PRIMARY KEY
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS description_terms (
+                kind TEXT NOT NULL,
+                term TEXT NOT NULL,
+                description_hash TEXT NOT NULL,
+                PRIMARY KEY (kind, term, description_hash)
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_transactions_description_hash ON transactions (description_hash)",
+            _rebuild_description_index,
+        ],
+    }),
+    (10, "Change tracking on transactions for delta sync", {
+        'sqlserver': [
+            """
+            IF COL_LENGTH('transactions', 'row_version') IS NULL
+            BEGIN
+                ALTER TABLE transactions ADD row_version ROWVERSION
+            END
+            """,
+            _sqlserver_index('IX_transactions_row_version', 'transactions', "(row_version)"),
+        ],
+        'sqlite': [
+            _add_sqlite_column('transactions', 'change_seq', 'INTEGER NOT NULL DEFAULT 0'),
+            "UPDATE transactions SET change_seq = id WHERE change_seq = 0",
+            "CREATE INDEX IF NOT EXISTS ix_transactions_change_seq ON transactions (change_seq)",
+            # SQLite has a single writer, so MAX + 1 is taken in commit order
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_transactions_change_seq_insert
+            AFTER INSERT ON transactions
+            BEGIN
+                UPDATE transactions SET change_seq = (SELECT MAX(change_seq) FROM transactions) + 1
+                WHERE id = NEW.id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_transactions_change_seq_update
+            AFTER UPDATE ON transactions
+            WHEN NEW.change_seq = OLD.change_seq
+            BEGIN
+                UPDATE transactions SET change_seq = (SELECT MAX(change_seq) FROM transactions) + 1
+                WHERE id = NEW.id;
+            END
+            """,
+        ],
+    }),
+    (11, "Replayed offline journal entries", {
+        'sqlserver': [
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='applied_journal_entries' AND xtype='U')
+            BEGIN
+                CREATE TABLE applied_journal_entries (
+                    entry_id CHAR(32) NOT NULL PRIMARY KEY,
+                    applied_on DATETIME NOT NULL
+                )
+            END
+            """,
+        ],
+        'sqlite': [
+            """
+            CREATE TABLE IF NOT EXISTS applied_journal_entries (
+                entry_id TEXT NOT NULL PRIMARY KEY,
+                applied_on DATETIME NOT NULL
+            )
+            """,
+        ],
+    }),
+    (12, "Receipt thumbnails next to stored documents", {
+        'sqlserver': [
+            """
+            IF COL_LENGTH('documents', 'thumbnail') IS NULL
+            BEGIN
+                ALTER TABLE documents ADD thumbnail VARBINARY(MAX) NULL
+            END
+            """,
+        ],
+        'sqlite': [
+            _add_sqlite_column('documents', 'thumbnail', 'BLOB NULL'),
+        ],
+    }),
+    (13, "Pixel dimensions of stored documents", {
+        'sqlserver': [
+            """
+            IF COL_LENGTH('documents', 'width') IS NULL
+            BEGIN
+                ALTER TABLE documents ADD width INT NULL, height INT NULL
+            END
+            """,
+        ],
+        'sqlite': [
+            _add_sqlite_column('documents', 'width', 'INTEGER NULL'),
+            _add_sqlite_column('documents', 'height', 'INTEGER NULL'),
+        ],
+    }),
+    (14, "CSV import progress committed with each chunk", {
+        'sqlserver': [
+            """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='import_checkpoints' AND xtype='U')
+            BEGIN
+                CREATE TABLE import_checkpoints (
+                    source NVARCHAR(400) NOT NULL PRIMARY KEY,
+                    byte_offset BIGINT NOT NULL,
+                    line_number INT NOT NULL,
+                    imported INT NOT NULL,
+                    rejected INT NOT NULL,
+                    updated_on DATETIME NOT NULL
+                )
+            END
+            """,
+        ],
+        'sqlite': [
+            """
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                source TEXT NOT NULL PRIMARY KEY,
+                byte_offset INTEGER NOT NULL,
+                line_number INTEGER NOT NULL,
+                imported INTEGER NOT NULL,
+                rejected INTEGER NOT NULL,
+                updated_on DATETIME NOT NULL
+            )
+            """,
+        ],
+    }),
+]
+
+
+def get_applied_versions(db, conn):
+    cursor = db.execute_with_reconnect(conn, "SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(db):
+    backend = db.backend.name
+    applied_now = []
+
+    with db.connection() as conn:
+        db.execute_with_reconnect(conn, SCHEMA_VERSION_TABLE[backend])
+        conn.commit()
+        applied = get_applied_versions(db, conn)
+
+        for version, description, steps in MIGRATIONS:
+            if version in applied:
+                continue
+
+            for step in steps[backend]:
+                if callable(step):
+                    # Callables use their own pooled connection, so earlier DDL must be visible to them
+                    conn.commit()
+                    step(db)
+                else:
+                    db.execute_with_reconnect(conn, step)
+
+            try:
+                db.execute_with_reconnect(conn, """
+                INSERT INTO schema_version (version, description, applied_on)
+                VALUES (?, ?, ?)
+                """, (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                conn.commit()
+            except db.backend.IntegrityError:
+                # Another client recorded this version first; its steps are idempotent
+                conn.rollback()
+                continue
+            applied_now.append(version)
+            print(f"Applied schema migration {version}: {description}")
+
+    return applied_now
+
+
+def get_schema_version(db):
+    with db.connection() as conn:
+        versions = get_applied_versions(db, conn)
+    return max(versions) if versions else 0
@@ -0,0 +1,185 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+_string_literal_re = re.compile(r"N?'(?:[^']|'')*'")
+_number_re = re.compile(r"\b\d+(?:\.\d+)?\b")
+_in_list_re = re.compile(r"IN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_whitespace_re = re.compile(r"\s+")
+
+
+def fingerprint(query):
+    # Collapse a statement to its shape so calls differing only in literals or IN-list length group together
+    shape = _string_literal_re.sub('?', query)
+    shape = _number_re.sub('?', shape)
+    shape = _in_list_re.sub('IN (...)', shape)
+    return _whitespace_re.sub(' ', shape).strip()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class QueryStats:
+    def __init__(self, slow_query_threshold=0.5, max_samples=1000):
+        self.slow_query_threshold = slow_query_threshold
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        self.logger = logging.getLogger('ARKA.Database')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_queries.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+    def _entry(self, shape):
+        entry = self._entries.get(shape)
+        if entry is None:
+            entry = self._entries[shape] = {
+                'calls': 0,
+                'errors': 0,
+                'rows': 0,
+                'retries': 0,
+                'reconnects': 0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+                'samples': deque(maxlen=self.max_samples)
+            }
+        return entry
+
+    def record(self, query, elapsed, rows=0, retries=0, reconnects=0, error=None):
+        shape = fingerprint(query)
+        with self._lock:
+            entry = self._entry(shape)
+            entry['calls'] += 1
+            entry['rows'] += rows
+            entry['retries'] += retries
+            entry['reconnects'] += reconnects
+            entry['total_time'] += elapsed
+            entry['max_time'] = max(entry['max_time'], elapsed)
+            entry['samples'].append(elapsed)
+            if error is not None:
+                entry['errors'] += 1
+
+        if error is not None or elapsed >= self.slow_query_threshold:
+            record = {
+                'event': 'query_error' if error is not None else 'slow_query',
+                'fingerprint': shape,
+                'elapsed_ms': round(elapsed * 1000, 1),
+                'rows': rows,
+                'retries': retries,
+                'reconnects': reconnects
+            }
+            if error is not None:
+                record['error'] = str(error)
+                self.logger.error(json.dumps(record))
+            else:
+                self.logger.warning(json.dumps(record))
+
+    def snapshot(self):
+        with self._lock:
+            items = [(shape, dict(entry, samples=sorted(entry['samples']))) for shape, entry in self._entries.items()]
+
+        rows = []
+        for shape, entry in items:
+            samples = entry.pop('samples')
+            entry['fingerprint'] = shape
+            entry['avg_time'] = entry['total_time'] / entry['calls'] if entry['calls'] else 0.0
+            entry['p50'] = percentile(samples, 0.50)
+            entry['p95'] = percentile(samples, 0.95)
+            entry['p99'] = percentile(samples, 0.99)
+            rows.append(entry)
+        rows.sort(key=lambda entry: entry['total_time'], reverse=True)
+        return rows
+
+    def dump(self, path, extra=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generated_on': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'slow_query_threshold_ms': self.slow_query_threshold * 1000,
+                'queries': self.snapshot(),
+                **(extra or {})
+            }, f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class InstrumentedCursor:
+    # Wraps a DB-API cursor and reports one statement once its result set is exhausted or closed.
+    # Only time spent inside the driver is counted, not time the caller spends between fetches.
+    def __init__(self, cursor, stats, query, elapsed, retries=0, reconnects=0):
+        self._cursor = cursor
+        self._stats = stats
+        self._query = query
+        self._elapsed = elapsed
+        self._retries = retries
+        self._reconnects = reconnects
+        self._rows = 0
+        self._finished = False
+        if cursor.description is None:
+            self._finish()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(self._cursor.fetchmany, size) if size else self._timed(self._cursor.fetchmany)
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self._stats.record(self._query, self._elapsed, self._rows, self._retries, self._reconnects)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
@@ -0,0 +1,110 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime
+
+class QueryStatsWindow:
+    def __init__(self, app):
+        self.app = app
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Query Statistics")
+        self.window.geometry("900x450")
+
+        self.center_window()
+
+        self.create_widgets()
+        self.load_stats()
+
+    def center_window(self):
+        self.window.update_idletasks()
+        width = self.window.winfo_width()
+        height = self.window.winfo_height()
+        x = (self.window.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.window.winfo_screenheight() // 2) - (height // 2)
+        self.window.geometry(f'900x450+{x}+{y}')
+
+    def create_widgets(self):
+        main_frame = ttk.Frame(self.window, padding="10 10 10 10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(main_frame, text="Queries by total time (ms):", font=('Segoe UI', 10, 'bold')).pack(anchor=tk.W)
+
+        columns = ('query', 'calls', 'errors', 'rows', 'retries', 'p50', 'p95', 'p99', 'max', 'total')
+        self.stats_tree = ttk.Treeview(main_frame, columns=columns, show='headings')
+        headings = {
+            'query': 'Query', 'calls': 'Calls', 'errors': 'Errors', 'rows': 'Rows', 'retries': 'Retries',
+            'p50': 'p50', 'p95': 'p95', 'p99': 'p99', 'max': 'Max', 'total': 'Total'
+        }
+        for column in columns:
+            self.stats_tree.heading(column, text=headings[column])
+            self.stats_tree.column(column, width=60, anchor=tk.E)
+        self.stats_tree.column('query', width=380, anchor=tk.W)
+        self.stats_tree.pack(fill=tk.BOTH, expand=True)
+
+        self.pool_label = ttk.Label(main_frame, text="")
+        self.pool_label.pack(anchor=tk.W, pady=(5, 0))
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=10)
+
+        ttk.Button(button_frame,
+                 text="Refresh",
+                 command=self.load_stats,
+                 style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(button_frame,
+                 text="Save to File",
+                 command=self.dump_stats).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(button_frame,
+                 text="Reset",
+                 command=self.reset_stats).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(button_frame,
+                 text="Mbyll",
+                 command=self.window.destroy).pack(side=tk.RIGHT)
+
+    def load_stats(self):
+        for item in self.stats_tree.get_children():
+            self.stats_tree.delete(item)
+
+        for entry in self.app.db.get_query_stats():
+            self.stats_tree.insert('', tk.END, values=(
+                entry['fingerprint'],
+                entry['calls'],
+                entry['errors'],
+                entry['rows'],
+                entry['retries'],
+                f"{entry['p50'] * 1000:.1f}",
+                f"{entry['p95'] * 1000:.1f}",
+                f"{entry['p99'] * 1000:.1f}",
+                f"{entry['max_time'] * 1000:.1f}",
+                f"{entry['total_time'] * 1000:.0f}"
+            ))
+
+        pool = self.app.db.get_pool_stats()
+        self.pool_label.config(
+            text=f"Pool: {pool['in_use']} in use, {pool['idle']} idle of {pool['max_size']}, "
+                 f"{pool['waits']} waits (avg {pool['wait_time_avg'] * 1000:.1f} ms)"
+        )
+
+    def dump_stats(self):
+        file_path = filedialog.asksaveasfilename(
+            parent=self.window,
+            title="Save Query Statistics",
+            defaultextension=".json",
+            initialfile=f"arka_query_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            filetypes=[("JSON files", "*.json")]
+        )
+        if not file_path:
+            return
+
+        try:
+            self.app.db.dump_query_stats(file_path)
+            messagebox.showinfo("Success", f"Query statistics saved to {file_path}", parent=self.window)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save query statistics: {str(e)}", parent=self.window)
+
+    def reset_stats(self):
+        if messagebox.askyesno("Confirm", "Clear all collected query statistics?", parent=self.window):
+            self.app.db.reset_query_stats()
+            self.load_stats()
@@ -0,0 +1,49 @@
+import io
+import os
+from PIL import Image, ImageOps
+
+
+class ReceiptIngest:
+    # Normalizes an attached receipt before it is stored: EXIF rotation is applied and the EXIF block
+    # (camera details, GPS position) dropped, the image is scaled down to max_dimension and re-encoded
+    # as JPEG at the given quality. Admins can keep the original file byte-for-byte instead.
+    def __init__(self, max_dimension=None, quality=None):
+        self.max_dimension = max_dimension or int(os.getenv('RECEIPT_MAX_DIMENSION', '2000'))
+        self.quality = quality or int(os.getenv('RECEIPT_JPEG_QUALITY', '80'))
+
+    def process(self, path, keep_original=False):
+        # Returns {'data': bytes or None, 'path': path or None, 'width', 'height', 'size'} describing
+        # what will be stored; exactly one of data and path is set
+        with Image.open(path) as img:
+            if keep_original:
+                return {
+                    'data': None,
+                    'path': path,
+                    'width': img.size[0],
+                    'height': img.size[1],
+                    'size': os.path.getsize(path)
+                }
+
+            # Lets the JPEG decoder scale down while decoding instead of loading every pixel
+            img.draft('RGB', (self.max_dimension, self.max_dimension))
+            icc_profile = img.info.get('icc_profile')
+            receipt = ImageOps.exif_transpose(img)
+            if receipt.mode not in ('RGB', 'L'):
+                receipt = receipt.convert('RGB')
+            receipt.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+            output = io.BytesIO()
+            # No exif argument is passed, so none of the original metadata is written back
+            receipt.save(
+                output, 'JPEG',
+                quality=self.quality, optimize=True, progressive=True, icc_profile=icc_profile
+            )
+
+        data = output.getvalue()
+        return {
+            'data': data,
+            'path': None,
+            'width': receipt.size[0],
+            'height': receipt.size[1],
+            'size': len(data)
+        }
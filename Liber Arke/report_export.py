@@ -0,0 +1,158 @@
+import csv
+import logging
+import os
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+except ImportError:
+    Workbook = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_COLUMNS = [
+    'id', 'registration_date', 'description', 'currency', 'amount', 'transaction_type',
+    'created_by', 'document_name', 'document_size', 'document_hash'
+]
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class ReportExportError(Exception):
+    pass
+
+
+class ReportExporter:
+    # Streams filtered transactions from the database cursor into a CSV, XLSX or Parquet file a batch
+    # at a time, so memory stays flat however many rows the report covers. Amounts are read as the
+    # stored DECIMAL, never through a float, and every row keeps its transaction id. db is the Database:
+    # the local replica only keeps float amounts, so exports always come from the server.
+    def __init__(self, db, batch_size=5000):
+        self.db = db
+        self.batch_size = batch_size
+
+        self.logger = logging.getLogger('ARKA.ReportExporter')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_reports.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+    @staticmethod
+    def available_formats():
+        # (label, extension) pairs for the save dialog; XLSX and Parquet need their optional packages
+        formats = [("CSV files", ".csv")]
+        if Workbook is not None:
+            formats.append(("Excel workbooks", ".xlsx"))
+        if pa is not None:
+            formats.append(("Parquet files", ".parquet"))
+        return formats
+
+    @staticmethod
+    def export_row(row):
+        # Report rows carry created_by as a username at 6 and the deleted_by name at 7, which is dropped.
+        # SQL Server returns the amount as a Decimal and it passes through untouched; SQLite keeps
+        # DECIMAL columns as numbers, which are written at the column's two decimal places.
+        amount = row[4] if isinstance(row[4], Decimal) else Decimal(str(row[4])).quantize(Decimal('0.01'))
+        return (row[0], row[1], row[3], row[2], amount, row[5], row[6], row[8], row[9], row[10])
+
+    def export(self, path, from_date, to_date, desc_filter=None, currency_filter=None, type_filter=None):
+        # Returns the number of rows written. The file is written next to path and moved into place
+        # at the end, so a failed export never leaves a truncated file behind.
+        writers = {'.csv': self._write_csv, '.xlsx': self._write_xlsx, '.parquet': self._write_parquet}
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in writers:
+            raise ReportExportError(f"Unsupported export format: {extension or path}")
+        if extension not in [ext for _, ext in self.available_formats()]:
+            raise ReportExportError(f"Exporting {extension} files needs a package that is not installed")
+
+        rows = (self.export_row(row) for row in self.db.iter_filtered_transactions(
+            from_date, to_date, desc_filter, currency_filter, type_filter, self.batch_size, exact_amounts=True
+        ))
+        batches = iter(lambda: list(islice(rows, self.batch_size)), [])
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            count = writers[extension](temp_path, batches)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+        self.logger.info(f"Exported {count} transactions to {path}")
+        return count
+
+    def _write_csv(self, path, batches):
+        count = 0
+        with open(path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for batch in batches:
+                writer.writerows(
+                    (row[0], self._format_date(row[1])) + row[2:] for row in batch
+                )
+                count += len(batch)
+        return count
+
+    def _write_xlsx(self, path, batches):
+        # Write-only mode streams rows into the sheet's XML instead of keeping a cell object per value
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Transactions')
+        sheet.append(EXPORT_COLUMNS)
+
+        count = 0
+        for batch in batches:
+            for row in batch:
+                date_cell = WriteOnlyCell(sheet, value=row[1])
+                date_cell.number_format = 'yyyy-mm-dd hh:mm:ss'
+                amount_cell = WriteOnlyCell(sheet, value=row[4])
+                amount_cell.number_format = '#,##0.00'
+                sheet.append([row[0], date_cell, row[2], row[3], amount_cell] + list(row[5:]))
+            count += len(batch)
+        workbook.save(path)
+        return count
+
+    def _write_parquet(self, path, batches):
+        schema = pa.schema([
+            ('id', pa.int64()),
+            ('registration_date', pa.timestamp('s')),
+            ('description', pa.string()),
+            ('currency', pa.string()),
+            ('amount', pa.decimal128(18, 2)),
+            ('transaction_type', pa.string()),
+            ('created_by', pa.string()),
+            ('document_name', pa.string()),
+            ('document_size', pa.int64()),
+            ('document_hash', pa.string())
+        ])
+
+        count = 0
+        # Each batch becomes one row group
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in batches:
+                columns = [list(column) for column in zip(*batch)]
+                columns[1] = [self._parse_date(value) for value in columns[1]]
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                count += len(batch)
+            if not count:
+                writer.write_table(schema.empty_table())
+        return count
+
+    @staticmethod
+    def _format_date(value):
+        return value.strftime(DATE_FORMAT) if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _parse_date(value):
+        if value is None or isinstance(value, datetime):
+            return value
+        return datetime.strptime(str(value)[:19], DATE_FORMAT)
@@ -0,0 +1,216 @@
+import os
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+
+class StorageBackend:
+    name = None
+    Error = Exception
+    IntegrityError = Exception
+    # Values the schema cannot hold, e.g. a string longer than its column
+    DataError = Exception
+    # Appended after ORDER BY; takes the row limit as its only parameter
+    limit_clause = None
+    # Change tracking for delta sync: the change sequence as an integer, the column to order by,
+    # and a filter taking the last sequence already seen
+    change_seq_column = None
+    change_seq_order = None
+    change_filter = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def source_name(self):
+        raise NotImplementedError
+
+    def ping(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            return True
+        except self.Error:
+            return False
+
+    def prepare_bulk_cursor(self, cursor):
+        pass
+
+    def empty_blob(self, size):
+        # SQL expression and parameters for a documents.data value that write_blob_chunks fills in
+        raise NotImplementedError
+
+    def write_blob_chunks(self, conn, document_hash, chunks):
+        raise NotImplementedError
+
+    def read_blob_chunks(self, conn, document_hash, chunk_size):
+        raise NotImplementedError
+
+    def day_sql(self, column):
+        raise NotImplementedError
+
+
+class SqlServerBackend(StorageBackend):
+    name = 'sqlserver'
+    Error = pyodbc.Error if pyodbc else Exception
+    IntegrityError = pyodbc.IntegrityError if pyodbc else Exception
+    DataError = pyodbc.DataError if pyodbc else Exception
+    limit_clause = " OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+    change_seq_column = "CAST(t.row_version AS BIGINT)"
+    change_seq_order = "t.row_version"
+    # Rows at or above MIN_ACTIVE_ROWVERSION may belong to open transactions that commit later
+    change_filter = "t.row_version > CAST(? AS BINARY(8)) AND t.row_version < MIN_ACTIVE_ROWVERSION()"
+
+    def __init__(self):
+        self.server = os.getenv('SQL_SERVER')
+        self.database = os.getenv('SQL_DATABASE')
+        self.driver = os.getenv('SQL_DRIVER', 'ODBC Driver 17 for SQL Server')
+        self.auth_type = os.getenv('SQL_AUTH', 'Windows')
+        self.username = os.getenv('SQL_USERNAME')
+        self.password = os.getenv('SQL_PASSWORD')
+
+    def get_connection_string(self):
+        if self.auth_type.lower() == 'windows':
+            return f'DRIVER={{{self.driver}}};SERVER={self.server};DATABASE={self.database};Trusted_Connection=yes;'
+        else:
+            return f'DRIVER={{{self.driver}}};SERVER={self.server};DATABASE={self.database};UID={self.username};PWD={self.password};'
+
+    def connect(self):
+        if pyodbc is None:
+            raise RuntimeError("pyodbc is required for the SQL Server backend")
+        return pyodbc.connect(self.get_connection_string())
+
+    def source_name(self):
+        return f"{self.name}:{self.server}/{self.database}"
+
+    def prepare_bulk_cursor(self, cursor):
+        # Send executemany parameters as one bound array instead of a round-trip per row
+        cursor.fast_executemany = True
+
+    def empty_blob(self, size):
+        return "0x", ()
+
+    def write_blob_chunks(self, conn, document_hash, chunks):
+        cursor = conn.cursor()
+        for chunk in chunks:
+            # .WRITE with a NULL offset appends in place instead of rewriting the whole value
+            cursor.execute(
+                "UPDATE documents SET data.WRITE(?, NULL, NULL) WHERE document_hash = ?",
+                (chunk, document_hash)
+            )
+
+    def read_blob_chunks(self, conn, document_hash, chunk_size):
+        cursor = conn.cursor()
+        offset = 1
+        while True:
+            cursor.execute(
+                "SELECT SUBSTRING(data, ?, ?) FROM documents WHERE document_hash = ?",
+                (offset, chunk_size, document_hash)
+            )
+            row = cursor.fetchone()
+            if not row or not row[0]:
+                return
+            yield bytes(row[0])
+            if len(row[0]) < chunk_size:
+                return
+            offset += len(row[0])
+
+    def day_sql(self, column):
+        return f"CAST({column} AS DATE)"
+
+
+def _convert_datetime(value):
+    text = value.decode()
+    try:
+        return datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return datetime.fromisoformat(text)
+
+
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_adapter(datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, float)
+
+
+class SqliteBackend(StorageBackend):
+    name = 'sqlite'
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+    DataError = sqlite3.DataError
+    limit_clause = " LIMIT ?"
+    change_seq_column = "t.change_seq"
+    change_seq_order = "t.change_seq"
+    change_filter = "t.change_seq > ?"
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SQLITE_PATH', 'arka.db')
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def source_name(self):
+        return f"{self.name}:{os.path.abspath(self.path)}"
+
+    def empty_blob(self, size):
+        return "zeroblob(?)", (size,)
+
+    def _document_rowid(self, conn, document_hash):
+        row = conn.execute("SELECT rowid FROM documents WHERE document_hash = ?", (document_hash,)).fetchone()
+        return row[0] if row else None
+
+    def write_blob_chunks(self, conn, document_hash, chunks):
+        if not hasattr(conn, 'blobopen'):
+            # Incremental blob I/O needs Python 3.11; older interpreters write the value in one piece
+            conn.execute("UPDATE documents SET data = ? WHERE document_hash = ?", (b''.join(chunks), document_hash))
+            return
+        with conn.blobopen('documents', 'data', self._document_rowid(conn, document_hash)) as blob:
+            for chunk in chunks:
+                blob.write(chunk)
+
+    def read_blob_chunks(self, conn, document_hash, chunk_size):
+        rowid = self._document_rowid(conn, document_hash)
+        if rowid is None:
+            return
+        if not hasattr(conn, 'blobopen'):
+            data = conn.execute("SELECT data FROM documents WHERE rowid = ?", (rowid,)).fetchone()[0]
+            for offset in range(0, len(data), chunk_size):
+                yield data[offset:offset + chunk_size]
+            return
+        with conn.blobopen('documents', 'data', rowid, readonly=True) as blob:
+            while True:
+                chunk = blob.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def day_sql(self, column):
+        return f"date({column})"
+
+
+BACKENDS = {
+    SqlServerBackend.name: SqlServerBackend,
+    SqliteBackend.name: SqliteBackend,
+}
+
+
+def create_backend(name=None):
+    name = (name or os.getenv('ARKA_BACKEND', SqlServerBackend.name)).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return BACKENDS[name]()
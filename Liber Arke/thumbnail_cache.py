@@ -0,0 +1,149 @@
+import io
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+
+THUMBNAIL_SIZE = (128, 128)
+
+
+def make_thumbnail(source, size=THUMBNAIL_SIZE, quality=75):
+    # source is a path or a binary file object; returns the thumbnail as JPEG bytes
+    with Image.open(source) as img:
+        # Lets the JPEG decoder scale down while decoding instead of loading every pixel
+        img.draft('RGB', (size[0] * 2, size[1] * 2))
+        # Phone photos are stored sideways with an EXIF orientation; turn them upright like the receipt
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail(size)
+        output = io.BytesIO()
+        img.save(output, 'JPEG', quality=quality)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    # Thumbnails by document hash: an in-memory LRU in front of a directory of files, in front of the
+    # documents table. Documents are content-addressed, so a cached thumbnail never goes stale.
+    def __init__(self, db, directory=None, memory_items=300, disk_items=5000):
+        self.db = db
+        self.directory = os.path.abspath(directory or os.getenv('THUMBNAIL_CACHE_DIR', 'arka_thumbnails'))
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory = OrderedDict()
+        self._missing = set()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.logger = logging.getLogger('ARKA.ThumbnailCache')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_reports.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, document_hash):
+        if not re.fullmatch(r'[0-9a-f]{64}', document_hash):
+            raise ValueError(f"Not a document hash: {document_hash}")
+        return os.path.join(self.directory, document_hash + '.jpg')
+
+    def _remember(self, document_hash, thumbnail):
+        with self._lock:
+            self._memory[document_hash] = thumbnail
+            self._memory.move_to_end(document_hash)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get_cached(self, document_hash):
+        # Memory only, so it is cheap enough for the Tk thread
+        with self._lock:
+            thumbnail = self._memory.get(document_hash)
+            if thumbnail is not None:
+                self._memory.move_to_end(document_hash)
+            return thumbnail
+
+    def get_many(self, document_hashes):
+        # Runs on a worker thread. Returns {document_hash: thumbnail bytes or None}.
+        result = {}
+        wanted = []
+        for document_hash in dict.fromkeys(document_hashes):
+            thumbnail = self.get_cached(document_hash)
+            if thumbnail is None:
+                thumbnail = self._read_disk(document_hash)
+            if thumbnail is not None:
+                self._remember(document_hash, thumbnail)
+                result[document_hash] = thumbnail
+            elif document_hash in self._missing:
+                result[document_hash] = None
+            else:
+                wanted.append(document_hash)
+
+        if wanted:
+            stored = self.db.get_document_thumbnails(wanted)
+            for document_hash in wanted:
+                thumbnail = stored.get(document_hash) or self._backfill(document_hash)
+                if thumbnail is None:
+                    self._missing.add(document_hash)
+                else:
+                    self._write_disk(document_hash, thumbnail)
+                    self._remember(document_hash, thumbnail)
+                result[document_hash] = thumbnail
+        return result
+
+    def _backfill(self, document_hash):
+        # Documents stored before thumbnails existed: build one from the full document once and keep
+        # it on the server, so no other client has to download the document for it again
+        try:
+            document = io.BytesIO()
+            if not self.db.copy_stored_document(document_hash, document):
+                return None
+            document.seek(0)
+            thumbnail = make_thumbnail(document)
+            self.db.set_document_thumbnail(document_hash, thumbnail)
+            return thumbnail
+        except Exception as e:
+            self.logger.warning(f"Could not build a thumbnail for document {document_hash}: {str(e)}")
+            return None
+
+    def _read_disk(self, document_hash):
+        path = self._path(document_hash)
+        try:
+            with open(path, 'rb') as f:
+                thumbnail = f.read()
+            # The file's modification time doubles as its last use for pruning
+            os.utime(path)
+            return thumbnail
+        except OSError:
+            return None
+
+    def _write_disk(self, document_hash, thumbnail):
+        path = self._path(document_hash)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(thumbnail)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Could not cache thumbnail {document_hash}: {str(e)}")
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        # Drops the least recently used files beyond disk_items
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.jpg')]
+        except OSError:
+            return
+        if len(entries) <= self.disk_items:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.disk_items]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
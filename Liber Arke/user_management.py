@@ -58,44 +58,41 @@ class UserManagementWindow:
                  command=self.window.destroy).pack(side=tk.RIGHT)
     
     def load_users(self):
-        if not self.app.check_db_connection():
+        self.app.check_db_connection(lambda: self.app.db_worker.submit(
+            self.app.db.get_all_users,
+            on_success=self.show_users,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load users: {str(e)}"),
+            status="Loading users"
+        ))
+    
+    def show_users(self, users):
+        # The window may have been closed while the users were loading
+        if not self.window.winfo_exists():
+            return
+        if users is None:
+            messagebox.showerror("Error", "Failed to load users from database")
             return
             
         for item in self.user_tree.get_children():
             self.user_tree.delete(item)
             
-        try:
-            users = self.app.db.get_all_users()
-            if users is None:
-                messagebox.showerror("Error", "Failed to load users from database")
-                return
-                
-            for user in users:
-                self.user_tree.insert('', tk.END, 
-                                    values=(user[1], user[2], 'Yes' if user[3] else 'No'), 
-                                    iid=user[0])
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load users: {str(e)}")
+        for user in users:
+            self.user_tree.insert('', tk.END, 
+                                values=(user[1], user[2], 'Yes' if user[3] else 'No'), 
+                                iid=user[0])
     
     def show_create_user(self):
-        if self.app.check_db_connection():
-            CreateUserDialog(self.app, self)
+        self.app.check_db_connection(lambda: CreateUserDialog(self.app, self))
     
     def show_change_password(self):
-        if not self.app.check_db_connection():
-            return
-            
         selected = self.user_tree.focus()
         if not selected:
             messagebox.showwarning("Warning", "Please select a user first")
             return
         
-        ChangePasswordDialog(self.app, selected, self)
+        self.app.check_db_connection(lambda: ChangePasswordDialog(self.app, selected, self))
         
     def toggle_upload_permission(self):
-        if not self.app.check_db_connection():
-            return
-            
         selected = self.user_tree.focus()
         if not selected:
             messagebox.showwarning("Warning", "Please select a user first")
@@ -104,11 +101,20 @@ class UserManagementWindow:
         current_value = self.user_tree.item(selected, 'values')[2]
         new_value = not (current_value == 'Yes')
         
-        if self.app.db.change_upload_permission(selected, new_value):
-            self.load_users()
-            messagebox.showinfo("Success", "Upload permission updated")
-        else:
+        self.app.check_db_connection(lambda: self.app.db_worker.submit(
+            self.app.db.change_upload_permission,
+            selected, new_value,
+            on_success=self.upload_permission_changed,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to update upload permission: {str(e)}"),
+            status="Updating upload permission"
+        ))
+    
+    def upload_permission_changed(self, success):
+        if not success:
             messagebox.showerror("Error", "Failed to update upload permission")
+            return
+        self.load_users()
+        messagebox.showinfo("Success", "Upload permission updated")
 
 class CreateUserDialog:
     def __init__(self, app, parent_window):
@@ -163,9 +169,6 @@ class CreateUserDialog:
         self.username_entry.focus()
     
     def create_user(self):
-        if not self.app.check_db_connection():
-            return
-            
         username = self.username_entry.get()
         password = self.password_entry.get()
         role = self.role_var.get()
@@ -179,15 +182,22 @@ class CreateUserDialog:
             messagebox.showerror("Error", "Password must be at least 6 characters")
             return
         
-        try:
-            if self.app.db.create_user(username, password, role, can_upload):
-                messagebox.showinfo("Success", "User created successfully")
-                self.parent.load_users()
-                self.dialog.destroy()
-            else:
-                messagebox.showerror("Error", "Username already exists")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to create user: {str(e)}")
+        self.app.check_db_connection(lambda: self.app.db_worker.submit(
+            self.app.db.create_user,
+            username, password, role, can_upload,
+            on_success=self.user_created,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to create user: {str(e)}"),
+            status="Creating user"
+        ))
+    
+    def user_created(self, success):
+        if not success:
+            messagebox.showerror("Error", "Username already exists")
+            return
+        messagebox.showinfo("Success", "User created successfully")
+        self.parent.load_users()
+        if self.dialog.winfo_exists():
+            self.dialog.destroy()
 
 class ChangePasswordDialog:
     def __init__(self, app, user_id, parent_window):
@@ -248,9 +258,6 @@ class ChangePasswordDialog:
         self.confirm_password_entry.bind("<Return>", lambda e: self.change_password())
     
     def change_password(self):
-        if not self.app.check_db_connection():
-            return
-            
         new_password = self.new_password_entry.get()
         confirm_password = self.confirm_password_entry.get()
         
@@ -266,11 +273,18 @@ class ChangePasswordDialog:
             messagebox.showerror("Error", "Password must be at least 6 characters")
             return
         
-        try:
-            if self.app.db.change_password(self.user_id, new_password):
-                messagebox.showinfo("Success", "Password changed successfully")
-                self.dialog.destroy()
-            else:
-                messagebox.showerror("Error", "Failed to change password")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to change password: {str(e)}")
\ No newline at end of file
+        self.app.check_db_connection(lambda: self.app.db_worker.submit(
+            self.app.db.change_password,
+            self.user_id, new_password,
+            on_success=self.password_changed,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to change password: {str(e)}"),
+            status="Changing password"
+        ))
+    
+    def password_changed(self, success):
+        if not success:
+            messagebox.showerror("Error", "Failed to change password")
+            return
+        messagebox.showinfo("Success", "Password changed successfully")
+        if self.dialog.winfo_exists():
+            self.dialog.destroy()
\ No newline at end of file
@@ -1,13 +1,14 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, messagebox
 
 class ViewBalancesTab:
     def __init__(self, app):
         self.app = app
         self.tab = ttk.Frame(app.notebook)
         app.notebook.add(self.tab, text="Gjendje Arke")
+        self.balances_request = 0
         self.create_widgets()
-        self.update_balances_view()
+        # Balances are loaded once someone has logged in
 
     def create_widgets(self):
         main_frame = ttk.Frame(self.tab, padding="15 15 15 15")
@@ -52,15 +53,26 @@ class ViewBalancesTab:
                   style='Accent.TButton').pack(pady=5)
 
     def update_balances_view(self):
-        if not self.app.check_db_connection():
+        self.app.check_db_connection(self.load_balances)
+
+    def load_balances(self):
+        self.balances_request += 1
+        request = self.balances_request
+        self.app.db_worker.submit(
+            self.app.db.get_balances,
+            on_success=lambda balances: self.show_balances(request, balances),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to update balances: {str(e)}"),
+            status="Loading balances"
+        )
+
+    def show_balances(self, request, balances):
+        if request != self.balances_request:
             return
             
         for item in self.balances_tree.get_children():
             self.balances_tree.delete(item)
         
         try:
-            balances = self.app.db.get_balances()
-            
             if balances is None:
                 messagebox.showerror("Error", "Failed to retrieve balances from database")
                 return
@@ -0,0 +1,356 @@
+import tkinter as tk
+from tkinter import ttk
+
+SORT_ARROWS = {False: ' ▲', True: ' ▼'}
+
+
+class RowSource:
+    # A fixed list of rows for a VirtualTreeview. Listeners are called with no arguments whenever rows
+    # are added or reordered.
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+        self.complete = True
+        self._listeners = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def window(self, start, stop):
+        # The rows at positions start to stop, as shown by the view
+        return self.rows[start:stop]
+
+    def iter_rows(self):
+        return iter(self.rows)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _changed(self):
+        for listener in self._listeners:
+            listener()
+
+    def request(self, count):
+        # Asks for at least count rows; paged sources fetch more in the background
+        pass
+
+    def load_all(self, callback):
+        callback()
+
+    def sort(self, key, reverse=False, column=None):
+        self.rows.sort(key=key, reverse=reverse)
+        self._changed()
+
+    def close(self):
+        self._listeners = []
+
+
+class PagedRowSource(RowSource):
+    # Fetches rows a page at a time on the db worker, only as far as the view has asked for.
+    # fetch_page(cursor, limit) runs on the worker and returns (rows, next_cursor); the first call gets
+    # cursor None, and a next_cursor of None means there is nothing more to fetch. With columns (a
+    # columnar.ColumnarRows) pages are converted to arrays on the worker and kept only there: rows stays
+    # empty, the view's window is built from the columns, and sorting on a column named in sort_fields
+    # orders the arrays directly instead of going through the Python key.
+    def __init__(self, worker, fetch_page, page_size=500, status=None, on_error=None, columns=None, sort_fields=None):
+        super().__init__()
+        self.worker = worker
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.status = status
+        self.on_error = on_error
+        self.columns = columns
+        self.sort_fields = sort_fields or {}
+        self.complete = False
+        self.loading = False
+        self.closed = False
+        self.error = None
+        self._cursor = None
+        self._wanted = 0
+        self._load_all_callbacks = []
+
+    def __len__(self):
+        return len(self.rows) if self.columns is None else len(self.columns)
+
+    def window(self, start, stop):
+        return super().window(start, stop) if self.columns is None else self.columns.rows(start, stop)
+
+    def iter_rows(self):
+        return super().iter_rows() if self.columns is None else self.columns.iter_rows()
+
+    def request(self, count):
+        self._wanted = max(self._wanted, count)
+        self._fetch_next()
+
+    def load_all(self, callback):
+        if self.complete:
+            callback()
+            return
+        self._load_all_callbacks.append(callback)
+        self._fetch_next()
+
+    def _fetch_next(self):
+        if self.loading or self.complete or self.closed or self.error:
+            return
+        if len(self) >= self._wanted and not self._load_all_callbacks:
+            return
+        self.loading = True
+        self.worker.submit(
+            self._fetch_page,
+            self._cursor, self.page_size,
+            on_success=self._loaded,
+            on_error=self._failed,
+            status=self.status
+        )
+
+    def _fetch_page(self, cursor, limit):
+        rows, next_cursor = self.fetch_page(cursor, limit)
+        if self.columns is not None:
+            return self.columns.make_block(rows), next_cursor
+        return rows, next_cursor
+
+    def _loaded(self, result):
+        self.loading = False
+        if self.closed:
+            return
+        page, self._cursor = result
+        if self.columns is not None:
+            self.columns.append_block(page)
+        else:
+            self.rows.extend(page)
+        self.complete = self._cursor is None
+        self._changed()
+
+        if self.complete:
+            callbacks, self._load_all_callbacks = self._load_all_callbacks, []
+            for callback in callbacks:
+                callback()
+        else:
+            self._fetch_next()
+
+    def _failed(self, error):
+        # No further pages are fetched after an error; the view keeps what it has
+        self.loading = False
+        self.error = error
+        self._load_all_callbacks = []
+        if not self.closed and self.on_error:
+            self.on_error(error)
+
+    def sort(self, key, reverse=False, column=None):
+        # Only called once every page has loaded
+        if self.columns is None:
+            super().sort(key, reverse)
+            return
+        field = self.sort_fields.get(column)
+        if field is not None:
+            order = self.columns.order(field, reverse)
+        else:
+            rows = list(self.columns.iter_rows())
+            order = sorted(range(len(rows)), key=lambda index: key(rows[index]), reverse=reverse)
+        self.columns.take(order)
+        self._changed()
+
+    def close(self):
+        # Pages still in flight for a source that was replaced are dropped when they arrive
+        self.closed = True
+        super().close()
+
+
+class VirtualTreeview(ttk.Frame):
+    # Shows a RowSource through a fixed set of recycled Treeview items, one per visible line, so Tk
+    # never holds more than a screenful of rows however large the source is. Scrolling only rewrites
+    # those items, and the source is asked for overscan rows past the window so pages arrive before
+    # the user reaches them. format_row(row) returns the item options (values, tags, image) for a row,
+    # and row_key(row) identifies a row across renders; sources that build rows on demand need a key
+    # taken from the row's values, since the same row comes back as a new tuple each time.
+    def __init__(self, parent, columns, format_row, sort_keys=None, overscan=50, on_render=None, row_key=id,
+                 **tree_options):
+        super().__init__(parent)
+        self.format_row = format_row
+        self.row_key = row_key
+        self.sort_keys = sort_keys or {}
+        self.overscan = overscan
+        self.on_render = on_render
+        self.source = RowSource()
+        self.offset = 0
+        self.sort_column = None
+        self.sort_reverse = False
+        self._slots = []
+        self._slot_rows = {}
+        # Selection is kept by row, since items are reused as the view scrolls
+        self._selected = set()
+        self._header_height = None
+
+        self.tree = ttk.Treeview(self, columns=columns, **tree_options)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        for column in self.sort_keys:
+            self.tree.heading(column, command=lambda c=column: self.sort_by(c))
+
+        self.tree.bind('<Configure>', lambda event: self.render())
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.yview('scroll', -3, 'units'))
+        self.tree.bind('<Button-5>', lambda event: self.yview('scroll', 3, 'units'))
+        self.tree.bind('<Button-1>', self._on_click, add='+')
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<Up>', lambda event: self._on_arrow(event, -1))
+        self.tree.bind('<Down>', lambda event: self._on_arrow(event, 1))
+        self.tree.bind('<Prior>', lambda event: self._on_page(-1))
+        self.tree.bind('<Next>', lambda event: self._on_page(1))
+
+    def set_source(self, source):
+        self.source.close()
+        self.source = source
+        source.add_listener(self.render)
+        self.offset = 0
+        self._selected.clear()
+        self._show_sort_arrow(None, False)
+        self.render()
+
+    def clear(self):
+        self.set_source(RowSource())
+
+    def _rowheight(self):
+        style = self.tree.cget('style') or 'Treeview'
+        try:
+            return int(ttk.Style().lookup(style, 'rowheight') or 20)
+        except (tk.TclError, ValueError):
+            return 20
+
+    def visible_count(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return 0
+        rowheight = self._rowheight()
+        header = self._header_height if self._header_height is not None else rowheight
+        return max(1, (height - header) // rowheight)
+
+    def render(self):
+        total = len(self.source)
+        count = self.visible_count()
+        self.offset = max(0, min(self.offset, total - count))
+        count = min(count, total - self.offset)
+
+        while len(self._slots) < count:
+            self._slots.append(self.tree.insert('', tk.END))
+        while len(self._slots) > count:
+            self.tree.delete(self._slots.pop())
+
+        self._slot_rows = {}
+        selection = []
+        rows = self.source.window(self.offset, self.offset + count)
+        for slot, row in zip(self._slots, rows):
+            options = {'text': '', 'values': (), 'tags': (), 'image': ''}
+            options.update(self.format_row(row))
+            self.tree.item(slot, **options)
+            self._slot_rows[slot] = row
+            if self.row_key(row) in self._selected:
+                selection.append(slot)
+        self.tree.selection_set(selection)
+
+        if self._slots and self._header_height is None:
+            bbox = self.tree.bbox(self._slots[0])
+            if bbox:
+                self._header_height = bbox[1]
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+        self.source.request(self.offset + count + self.overscan)
+        if self.on_render:
+            self.on_render()
+
+    def yview(self, *args):
+        if not args:
+            return
+        count = max(1, len(self._slots))
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.source))
+        elif args[0] == 'scroll':
+            self.offset += int(args[1]) * (count if args[2] == 'pages' else 1)
+        self.render()
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        step = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self.yview('scroll', step * 3, 'units')
+        return 'break'
+
+    def _on_click(self, event):
+        # A plain click replaces the selection, including rows scrolled out of view
+        if not event.state & 0x0005 and self.tree.identify_region(event.x, event.y) in ('cell', 'tree'):
+            self._selected.clear()
+
+    def _on_select(self, event):
+        selection = set(self.tree.selection())
+        for slot, row in self._slot_rows.items():
+            if slot in selection:
+                self._selected.add(self.row_key(row))
+            else:
+                self._selected.discard(self.row_key(row))
+
+    def _on_arrow(self, event, step):
+        # Moving past the first or last item scrolls the window instead of leaving it
+        focus = self.tree.focus()
+        if not self._slots or focus not in self._slots:
+            return None
+        index = self._slots.index(focus) + step
+        if 0 <= index < len(self._slots):
+            if not event.state & 0x0001:
+                self._selected.clear()
+            return None
+
+        position = self.offset + self._slots.index(focus) + step
+        if not 0 <= position < len(self.source):
+            return 'break'
+        if not event.state & 0x0001:
+            self._selected.clear()
+        self._selected.add(self.row_key(self.source.window(position, position + 1)[0]))
+        self.offset += step
+        self.render()
+        self.tree.focus(self._slots[0] if step < 0 else self._slots[-1])
+        return 'break'
+
+    def _on_page(self, step):
+        self.yview('scroll', step, 'pages')
+        return 'break'
+
+    def sort_by(self, column):
+        # Sorting needs every row, so a paged source is read to the end first
+        reverse = self.sort_column == column and not self.sort_reverse
+        source = self.source
+        source.load_all(lambda: self._sort(source, column, reverse))
+
+    def _sort(self, source, column, reverse):
+        if source is not self.source:
+            return
+        self._show_sort_arrow(column, reverse)
+        self.offset = 0
+        source.sort(self.sort_keys[column], reverse, column)
+
+    def _show_sort_arrow(self, column, reverse):
+        for name in self.sort_keys:
+            text = self.tree.heading(name, 'text')
+            for arrow in SORT_ARROWS.values():
+                if text.endswith(arrow):
+                    text = text[:-len(arrow)]
+            if name == column:
+                text += SORT_ARROWS[reverse]
+            self.tree.heading(name, text=text)
+        self.sort_column = column
+        self.sort_reverse = reverse
+
+    def refresh(self):
+        self.render()
+
+    def row_for_item(self, item):
+        return self._slot_rows.get(item)
+
+    def visible_rows(self):
+        return [self._slot_rows[slot] for slot in self._slots]
+
+    def selected_rows(self):
+        return [row for row in self.source.iter_rows() if self.row_key(row) in self._selected]
@@ -0,0 +1,187 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+
+class WriteJournal:
+    # Append-only, fsync'd JSONL journal of transactions that have not reached the server yet.
+    # "add" lines carry a transaction and are matched by later "ack" lines once the server has it;
+    # attached documents are spooled next to the journal as files named by their SHA-256.
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or os.getenv('WRITE_JOURNAL_PATH', 'arka_journal.jsonl'))
+        self.document_dir = self.path + '.documents'
+        self.rejected_path = self.path + '.rejected'
+        self.max_batch_bytes = 20 * 1024 * 1024
+        self.chunk_size = 1024 * 1024
+        self._lock = threading.Lock()
+
+        self.logger = logging.getLogger('ARKA.WriteJournal')
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.FileHandler('arka_journal.log')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+        os.makedirs(self.document_dir, exist_ok=True)
+        self._pending = self._load()
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def _load(self):
+        pending = {}
+        if not os.path.exists(self.path):
+            return pending
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            # A crash mid-write leaves a last line without its newline. It was never reported as saved,
+            # and it is cut off so the next append starts on a line of its own instead of joining it.
+            self.logger.warning(f"{self.path} ends in an incomplete line of {len(data) - end} bytes, removed")
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+            data = data[:end]
+
+        for number, line in enumerate(data.decode('utf-8', errors='replace').splitlines(), 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.logger.warning(f"{self.path}:{number} is unreadable and was skipped")
+                continue
+            if record['op'] == 'add':
+                pending[record['id']] = record
+            elif record['op'] == 'ack':
+                for entry_id in record['ids']:
+                    pending.pop(entry_id, None)
+        return pending
+
+    def _write_line(self, record):
+        with open(self.path, 'ab') as f:
+            start = f.tell()
+            try:
+                f.write((json.dumps(record) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                # Don't leave a partial line for the next append to run into
+                f.truncate(start)
+                raise
+
+    def _spool_document(self, document_data=None, document_path=None):
+        # Copied a chunk at a time and hashed on the way, so large scans never sit in memory whole
+        temp_path = os.path.join(self.document_dir, uuid.uuid4().hex + '.tmp')
+        hasher = hashlib.sha256()
+        with open(temp_path, 'wb') as f:
+            if document_path:
+                with open(document_path, 'rb') as source:
+                    for chunk in iter(lambda: source.read(self.chunk_size), b''):
+                        hasher.update(chunk)
+                        f.write(chunk)
+            else:
+                hasher.update(document_data)
+                f.write(document_data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        document_hash = hasher.hexdigest()
+        spooled_path = os.path.join(self.document_dir, document_hash)
+        if os.path.exists(spooled_path):
+            os.unlink(temp_path)
+        else:
+            os.replace(temp_path, spooled_path)
+        return document_hash
+
+    def append(self, transaction, document_data=None, document_path=None, thumbnail=None):
+        # transaction holds add_transaction keyword arguments except the document, which is given as
+        # bytes or as a file path; returns the entry id
+        record = {
+            'op': 'add',
+            'id': uuid.uuid4().hex,
+            'queued_on': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'transaction': transaction,
+            'document': None,
+            # Thumbnails are a few KB, so they travel inside the line itself
+            'thumbnail': base64.b64encode(thumbnail).decode('ascii') if thumbnail else None
+        }
+        with self._lock:
+            if document_data or document_path:
+                record['document'] = self._spool_document(document_data, document_path)
+            self._write_line(record)
+            self._pending[record['id']] = record
+        return record['id']
+
+    def acknowledge(self, entry_ids):
+        if not entry_ids:
+            return
+        with self._lock:
+            self._write_line({'op': 'ack', 'ids': list(entry_ids)})
+            for entry_id in entry_ids:
+                self._pending.pop(entry_id, None)
+            if not self._pending:
+                self._compact()
+
+    def _compact(self):
+        # Everything is acknowledged, so the journal and its spooled documents can start over
+        os.unlink(self.path)
+        for name in os.listdir(self.document_dir):
+            os.unlink(os.path.join(self.document_dir, name))
+
+    def _reject(self, record, error):
+        with open(self.rejected_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(record, error=error)) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.logger.error(f"Journal entry {record['id']} rejected by the server: {error}")
+
+    def _next_batch(self, batch_size):
+        with self._lock:
+            records = list(self._pending.values())
+
+        batch = []
+        batch_bytes = 0
+        for record in records:
+            transaction = dict(record['transaction'])
+            if record['document']:
+                # The database streams the spooled file itself rather than taking its bytes
+                transaction['document_path'] = os.path.join(self.document_dir, record['document'])
+                batch_bytes += os.path.getsize(transaction['document_path'])
+            if record.get('thumbnail'):
+                transaction['document_thumbnail'] = base64.b64decode(record['thumbnail'])
+            batch.append((record, transaction))
+            if len(batch) >= batch_size or batch_bytes >= self.max_batch_bytes:
+                break
+        return batch
+
+    def replay(self, db, batch_size=50):
+        # Drains the journal in batches; raises on the first database error so it is retried later.
+        # Returns {'applied': count, 'rejected': [(entry_id, error)]}.
+        applied_count = 0
+        rejected = []
+        while True:
+            batch = self._next_batch(batch_size)
+            if not batch:
+                break
+
+            applied, batch_rejected = db.add_journal_entries(
+                [(record['id'], transaction) for record, transaction in batch]
+            )
+            for record, _ in batch:
+                if record['id'] in batch_rejected:
+                    self._reject(record, batch_rejected[record['id']])
+                    rejected.append((record['id'], batch_rejected[record['id']]))
+
+            self.acknowledge(applied + list(batch_rejected))
+            applied_count += len(applied)
+            self.logger.info(f"Replayed {len(applied)} journal entries, {self.pending_count} pending")
+
+        return {'applied': applied_count, 'rejected': rejected}